@@ -0,0 +1,166 @@
+import asyncio
+import contextvars
+import inspect
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from app_logging import get_logger
+from profiling import profile_thread
+
+logger = get_logger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed instead of queued"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+# Event loop of each pipeline worker thread, created on first use
+_worker = threading.local()
+
+
+def _run_in_worker(func, args, kwargs):
+    """Run ``func`` to completion on this worker thread's own event loop
+    (profiled along with the request when it is)"""
+    with profile_thread():
+        if not inspect.iscoroutinefunction(func):
+            return func(*args, **kwargs)
+        loop = getattr(_worker, "loop", None)
+        if loop is None:
+            loop = _worker.loop = asyncio.new_event_loop()
+        return loop.run_until_complete(func(*args, **kwargs))
+
+
+class AdmissionController:
+    """Bound how many requests run the NLP/retrieval stages at once.
+
+    Up to ``max_concurrency`` requests run; up to ``max_queue`` more wait at
+    most ``max_wait`` seconds for a slot. Anything beyond that is rejected
+    immediately so callers get a fast 503 instead of unbounded latency.
+
+    The stages are largely synchronous (RAKE, NER, filtering, ranking), so
+    ``run`` executes them on a pool of ``max_concurrency`` threads. The event
+    loop stays free to admit, queue and shed requests while they work, and a
+    slot is only released once its thread has finished.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, max_wait: float):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.max_wait = max_wait
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._in_flight = 0
+        self._queued = 0
+        self._admitted = 0
+        self._rejected_queue_full = 0
+        self._rejected_timeout = 0
+        # Exponentially weighted service time, used for Retry-After hints
+        self._service_time = 1.0
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="pipeline")
+
+    def _retry_after(self) -> int:
+        backlog = self._queued + self._in_flight
+        return max(1, math.ceil(self._service_time * backlog / self.max_concurrency))
+
+    async def _acquire(self) -> float:
+        """Take a slot, waiting in the bounded queue if needed; returns the start time"""
+        if self._semaphore.locked():
+            if self._queued >= self.max_queue:
+                self._rejected_queue_full += 1
+                logger.warning("Admission queue full, shedding request",
+                               extra={"data": {"queued": self._queued, "in_flight": self._in_flight}})
+                raise AdmissionRejected("queue full", self._retry_after())
+
+            self._queued += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self.max_wait)
+            except asyncio.TimeoutError:
+                self._rejected_timeout += 1
+                logger.warning("Admission wait exceeded %.1fs, shedding request", self.max_wait)
+                raise AdmissionRejected("queue wait timeout", self._retry_after())
+            finally:
+                self._queued -= 1
+        else:
+            await self._semaphore.acquire()
+
+        self._in_flight += 1
+        self._admitted += 1
+        return time.monotonic()
+
+    def _release(self, start: float) -> None:
+        self._in_flight -= 1
+        self._semaphore.release()
+        self._service_time = 0.8 * self._service_time + 0.2 * (time.monotonic() - start)
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one concurrency slot for the duration of the block"""
+        start = await self._acquire()
+        try:
+            yield
+        finally:
+            self._release(start)
+
+    async def run(self, func, *args, **kwargs):
+        """Run ``func`` (sync or async) on the pipeline pool under a slot.
+
+        If the caller is cancelled the slot stays held until the worker
+        thread actually finishes, so the pool never runs more than
+        ``max_concurrency`` requests.
+        """
+        start = await self._acquire()
+        context = contextvars.copy_context()
+        try:
+            future = asyncio.get_running_loop().run_in_executor(
+                self._executor, context.run, _run_in_worker, func, args, kwargs
+            )
+        except BaseException:
+            # Pool refused the work (e.g. shut down): the slot was never used
+            self._release(start)
+            raise
+        try:
+            result = await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if future.done():
+                self._release(start)
+            else:
+                future.add_done_callback(lambda _: self._release(start))
+            raise
+        except BaseException:
+            self._release(start)
+            raise
+        self._release(start)
+        return result
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "max_wait_s": self.max_wait,
+            "in_flight": self._in_flight,
+            "queue_depth": self._queued,
+            "admitted": self._admitted,
+            "rejected_queue_full": self._rejected_queue_full,
+            "rejected_timeout": self._rejected_timeout,
+            "avg_service_time_s": round(self._service_time, 4),
+        }
+
+
+def admission_from_env() -> AdmissionController:
+    """Build the controller from ADMISSION_* environment variables"""
+    return AdmissionController(
+        max_concurrency=int(os.getenv("ADMISSION_MAX_CONCURRENCY", str(os.cpu_count() or 1))),
+        max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "32")),
+        max_wait=float(os.getenv("ADMISSION_MAX_WAIT_S", "5")),
+    )
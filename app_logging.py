@@ -0,0 +1,134 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import re
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+
+# Request ID of the request currently being handled ("-" outside a request)
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+_listener = None
+
+
+def new_request_id() -> str:
+    """Return a fresh request ID"""
+    return uuid.uuid4().hex
+
+
+_REQUEST_ID_UNSAFE = re.compile(r"[^A-Za-z0-9_-]")
+MAX_REQUEST_ID_LENGTH = 64
+
+
+def safe_request_id(value) -> str:
+    """Client-supplied request ID reduced to [A-Za-z0-9_-], at most 64
+    characters (it ends up in logs, headers and file names); a fresh ID if
+    nothing is left"""
+    cleaned = _REQUEST_ID_UNSAFE.sub("", value or "")[:MAX_REQUEST_ID_LENGTH]
+    return cleaned or new_request_id()
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp every record with the current request ID.
+
+    Attached to the QueueHandler so the ID is read on the request's own task,
+    not later on the listener thread.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "request_id"):
+            record.request_id = request_id_var.get()
+        return True
+
+
+class StructuredFormatter(logging.Formatter):
+    """Format records as one JSON object per line.
+
+    Structured fields are passed with ``extra={"data": {...}}``.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+            + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "msg": record.getMessage(),
+        }
+        data = getattr(record, "data", None)
+        if data:
+            payload.update(data)
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            # Already rendered by StructuredQueueHandler before queueing
+            payload["exc"] = record.exc_text
+        if record.stack_info:
+            payload["stack"] = record.stack_info
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class StructuredQueueHandler(QueueHandler):
+    """QueueHandler that keeps the traceback out of ``msg``.
+
+    The stock ``prepare`` formats the whole record (traceback included) into
+    ``msg`` and clears ``exc_info`` before queueing, so the formatter on the
+    listener thread never sees the exception. Here only the message is
+    merged; the traceback travels in ``exc_text`` for StructuredFormatter.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+def setup_logging(level: str = None) -> None:
+    """Route the root logger through a queue drained by a background thread.
+
+    Safe to call more than once; only the first call installs handlers.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = StructuredQueueHandler(log_queue)
+    queue_handler.addFilter(RequestIdFilter())
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(StructuredFormatter())
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.handlers[:] = [queue_handler]
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(name)
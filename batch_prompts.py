@@ -0,0 +1,174 @@
+"""Offline batch prompt generation.
+
+Streams a JSONL file of queries through DemoApis.final_response on a process
+pool and writes one JSONL result per input line, in input order:
+
+    python batch_prompts.py queries.jsonl prompts.jsonl --workers 4
+    python batch_prompts.py queries.jsonl prompts.jsonl --resume
+
+The query text is read from ``--field`` (default: the first of user_input,
+query, body, text present on the line). Models and the catalog are loaded
+once per worker process. At most ``--window`` queries are in flight, so
+memory stays bounded regardless of input size. ``--resume`` keeps the
+results already in the output file and continues after them.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+DEFAULT_FIELDS = ("user_input", "query", "body", "text")
+
+# Per-worker state, set up once by _init_worker
+_apis = None
+_loop = None
+
+
+def _init_worker(weather_api_key: str, deterministic: bool) -> None:
+    global _apis, _loop
+    from main import DemoApis, catalog
+    from user_keywords_ext import preload_nlp
+
+    preload_nlp()
+    catalog.ensure_loaded()
+    _apis = DemoApis(weather_api_key=weather_api_key, deterministic=deterministic)
+    _loop = asyncio.new_event_loop()
+
+
+def _run_one(index: int, record: dict, field: str) -> dict:
+    query = _query_of(record, field)
+    result = {"index": index}
+    if "request_id" in record:
+        result["request_id"] = record["request_id"]
+    if not query:
+        result["error"] = "no query text"
+        return result
+    try:
+        prompt = _loop.run_until_complete(_apis.final_response(query))
+        if isinstance(prompt, str):
+            result["prompt"] = prompt
+        else:
+            result["error"] = "Failed to generate response."
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+
+def _query_of(record: dict, field: str) -> str:
+    if field:
+        return str(record.get(field) or "").strip()
+    for name in DEFAULT_FIELDS:
+        if record.get(name):
+            return str(record[name]).strip()
+    return ""
+
+
+def _completed_lines(path: str, chunk_size: int = 1 << 20) -> int:
+    """Count complete result lines, dropping a torn last line if any.
+
+    Streams the file in fixed-size chunks, so memory stays bounded however
+    large the output has grown.
+    """
+    if not os.path.exists(path):
+        return 0
+    with open(path, "rb+") as f:
+        # Find the last newline by reading backwards from the end
+        size = f.seek(0, os.SEEK_END)
+        keep = 0
+        end = size
+        while end > 0:
+            start = max(0, end - chunk_size)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b"\n")
+            if newline != -1:
+                keep = start + newline + 1
+                break
+            end = start
+        if keep != size:
+            f.truncate(keep)
+
+        f.seek(0)
+        lines = 0
+        remaining = keep
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            lines += chunk.count(b"\n")
+            remaining -= len(chunk)
+    return lines
+
+
+def _read_records(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = {}
+            # Valid JSON that is not an object ("text", [...]) has no fields
+            # either: an error line, not a worker crash
+            yield record if isinstance(record, dict) else {}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL file of queries")
+    parser.add_argument("output", help="JSONL file of results")
+    parser.add_argument("--field", default=None, help="JSON field holding the query text")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--window", type=int, default=0, help="max in-flight queries (default 4 x workers)")
+    parser.add_argument("--resume", action="store_true", help="continue after results already in output")
+    parser.add_argument("--deterministic", action="store_true", help="seed per-input randomness")
+    parser.add_argument("--progress-every", type=int, default=100)
+    args = parser.parse_args()
+
+    window = args.window or 4 * args.workers
+    skip = _completed_lines(args.output) if args.resume else 0
+    mode = "a" if args.resume else "w"
+    if skip:
+        print(f"Resuming after {skip} completed queries", file=sys.stderr)
+
+    records = enumerate(_read_records(args.input))
+    records = islice(records, skip, None)
+
+    done = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(
+        max_workers=args.workers,
+        initializer=_init_worker,
+        initargs=(os.getenv("WEATHER_API"), args.deterministic),
+    ) as pool, open(args.output, mode, encoding="utf-8") as out:
+        in_flight = deque()
+
+        def drain_one():
+            nonlocal done
+            out.write(json.dumps(in_flight.popleft().result(), ensure_ascii=False) + "\n")
+            done += 1
+            if args.progress_every and done % args.progress_every == 0:
+                out.flush()
+                elapsed = time.perf_counter() - start
+                print(f"{done} queries, {done / elapsed:.1f}/s", file=sys.stderr)
+
+        for index, record in records:
+            in_flight.append(pool.submit(_run_one, index, record, args.field))
+            if len(in_flight) >= window:
+                drain_one()
+        while in_flight:
+            drain_one()
+
+    elapsed = time.perf_counter() - start
+    rate = done / elapsed if elapsed > 0 else 0.0
+    print(f"Done: {done} queries in {elapsed:.1f}s ({rate:.1f}/s) -> {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX
+    fcntl = None
+
+from app_logging import get_logger
+
+logger = get_logger(__name__)
+
+CATEGORIES = ("Hotels", "Activities", "Restaurants", "Shopping")
+
+
+def bucket_key(data_type: str, location: str) -> str:
+    """Key of a location's item list inside a category, e.g. "paris_hotels" """
+    return f"{location.lower()}_{data_type.lower()}"
+
+
+class CatalogStore:
+    """In-memory catalog backed by a base snapshot plus an append-only journal.
+
+    Upserts and deletes are appended to the journal (one JSON line each) and
+    applied copy-on-write: the affected bucket list is copied, changed and
+    swapped in, so a reader holding ``data`` (or a bucket list) keeps a
+    consistent snapshot while a write lands, and write cost scales with the
+    bucket rather than the catalog. ``compact()`` folds the journal into a new
+    snapshot. ``product_ref`` is unique per bucket; duplicates in the snapshot
+    are dropped at load (first one wins).
+
+    Every worker process tails the same journal: ``refresh()`` applies entries
+    written by other processes and reloads after another process compacted.
+    """
+
+    def __init__(self, snapshot_path: str = "./test_data.json",
+                 journal_path: str = "./catalog_journal.jsonl"):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path
+        self._lock = threading.RLock()
+        self._data: Dict = {}
+        # (data_type, bucket) -> (item list, {product_ref: position in list});
+        # replaced as a whole so the two always match
+        self._index: Dict = {}
+        self._journal_entries = 0
+        self._journal_offset = 0
+        self._files_signature = None
+        self._loaded = False
+
+    # -- loading -----------------------------------------------------------
+
+    def ensure_loaded(self) -> None:
+        if not self._loaded:
+            self.load()
+
+    def load(self) -> None:
+        """Read the base snapshot and replay the journal over it"""
+        with self._lock:
+            try:
+                with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                logger.warning("Catalog snapshot %s missing or invalid, starting empty", self.snapshot_path)
+                data = {}
+            self._index = _build_index(data)
+            self._data = data
+
+            self._journal_entries = 0
+            self._journal_offset = 0
+            self._files_signature = self._signature()
+            self._replay_journal()
+            self._loaded = True
+            logger.info("Catalog loaded", extra={"data": {"journal_entries": self._journal_entries,
+                                                          "version": self.version}})
+
+    def _signature(self):
+        """Identity of the snapshot and journal files (changes on compaction)"""
+        sig = []
+        for path in (self.snapshot_path, self.journal_path):
+            try:
+                st = os.stat(path)
+                sig.append((st.st_ino, st.st_mtime_ns) if path == self.snapshot_path else st.st_ino)
+            except OSError:
+                sig.append(None)
+        return tuple(sig)
+
+    def _replay_journal(self) -> None:
+        """Apply journal lines written after the last replayed offset"""
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, "rb") as f:
+            f.seek(self._journal_offset)
+            chunk = f.read()
+        # Leave a partially written final line for the next replay
+        complete = chunk[: chunk.rfind(b"\n") + 1]
+        for line in complete.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                self._apply(json.loads(line))
+            except (ValueError, KeyError):
+                logger.warning("Skipping unreadable catalog journal entry")
+                continue
+            self._journal_entries += 1
+        self._journal_offset += len(complete)
+
+    def refresh(self) -> None:
+        """Pick up changes made by other processes (two stat calls when idle).
+
+        Never waits for a write in progress in this process (which holds the
+        lock across its fsync and applies its own entry). Still blocking: it
+        replays new journal lines, and reloads the whole snapshot after
+        another process compacted, so call it from a worker thread.
+        """
+        if not self._loaded:
+            self.load()
+            return
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            if self._signature() != self._files_signature:
+                # Another process compacted: start again from the new snapshot
+                self.load()
+                return
+            try:
+                size = os.path.getsize(self.journal_path)
+            except OSError:
+                return
+            if size > self._journal_offset:
+                self._replay_journal()
+        finally:
+            self._lock.release()
+
+    # -- reads -------------------------------------------------------------
+
+    @property
+    def data(self) -> Dict:
+        """Catalog in the same shape as test_data.json"""
+        self.ensure_loaded()
+        return self._data
+
+    @property
+    def version(self) -> str:
+        """Changes whenever the catalog content changes.
+
+        Derived from the snapshot/journal file identity and the replayed
+        journal offset, so workers that have applied the same changes report
+        the same version (safe to use in caches shared across processes).
+        """
+        self.ensure_loaded()
+        files = hashlib.sha1(repr(self._files_signature).encode("utf-8")).hexdigest()[:12]
+        return f"{files}.{self._journal_offset}"
+
+    def snapshot(self) -> Tuple[Dict, str]:
+        """``(data, version)`` taken together, so the version describes
+        exactly that data even while another thread applies changes"""
+        self.ensure_loaded()
+        with self._lock:
+            return self._data, self.version
+
+    def get_item(self, data_type: str, location: str, product_ref: str) -> Optional[Dict]:
+        self.ensure_loaded()
+        items, positions = self._index.get((data_type, bucket_key(data_type, location)), ([], {}))
+        pos = positions.get(product_ref)
+        return None if pos is None else items[pos]
+
+    def get_items_by_refs(self, data_type: str, location: str, product_refs: List[str]) -> List[Dict]:
+        """Resolve product_refs to items, skipping any that no longer exist"""
+        self.ensure_loaded()
+        items, positions = self._index.get((data_type, bucket_key(data_type, location)), ([], {}))
+        return [items[positions[ref]] for ref in product_refs if ref in positions]
+
+    def locations(self) -> List[str]:
+        """Every location with at least one catalog bucket"""
+        self.ensure_loaded()
+        found = set()
+        for data_type in CATEGORIES:
+            suffix = f"_{data_type.lower()}"
+            for bucket in self._data.get(data_type, {}):
+                if bucket.endswith(suffix):
+                    found.add(bucket[: -len(suffix)])
+        return sorted(found)
+
+    def get_value(self, key: str, default=None):
+        """Top-level non-catalog value (e.g. cached weather text)"""
+        self.ensure_loaded()
+        return self._data.get(key, default)
+
+    # -- writes ------------------------------------------------------------
+
+    def upsert(self, data_type: str, location: str, item: Dict) -> bool:
+        """Insert or replace one item by product_ref. Returns True if it was new."""
+        if data_type not in CATEGORIES:
+            raise ValueError(f"Unknown data type: {data_type}")
+        if not item.get("product_ref"):
+            raise ValueError("item must have a product_ref")
+        entry = {"op": "upsert", "type": data_type, "location": location.lower(), "item": item}
+        with self._lock, self._file_lock():
+            self.refresh()
+            created = self.get_item(data_type, location, item["product_ref"]) is None
+            self._append(entry)
+        return created
+
+    def delete(self, data_type: str, location: str, product_ref: str) -> bool:
+        """Remove one item by product_ref. Returns False if it did not exist."""
+        if data_type not in CATEGORIES:
+            raise ValueError(f"Unknown data type: {data_type}")
+        entry = {"op": "delete", "type": data_type, "location": location.lower(), "product_ref": product_ref}
+        with self._lock, self._file_lock():
+            self.refresh()
+            if self.get_item(data_type, location, product_ref) is None:
+                return False
+            self._append(entry)
+        return True
+
+    def set_value(self, key: str, value) -> None:
+        """Set a top-level non-catalog value through the journal"""
+        if key in CATEGORIES:
+            raise ValueError(f"{key} is a catalog category")
+        entry = {"op": "set", "key": key, "value": value}
+        with self._lock, self._file_lock():
+            self.refresh()
+            self._append(entry)
+
+    @contextmanager
+    def _file_lock(self):
+        """Serialize journal writers and compaction across processes"""
+        if fcntl is None:
+            yield
+            return
+        with open(self.journal_path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _append(self, entry: Dict) -> None:
+        """Durably append one entry, then apply it by replaying the journal"""
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        if self._files_signature[1] is None:
+            # First entry created the journal file
+            self._files_signature = self._signature()
+        self._replay_journal()
+
+    def _apply(self, entry: Dict) -> None:
+        """Apply one journal entry copy-on-write (nothing changes if it raises)"""
+        op = entry["op"]
+        if op == "set":
+            self._data = {**self._data, entry["key"]: entry["value"]}
+            return
+        data_type = entry["type"]
+        bucket = bucket_key(data_type, entry["location"])
+        items, positions = self._index.get((data_type, bucket), ([], {}))
+        if op == "upsert":
+            item = entry["item"]
+            pos = positions.get(item["product_ref"])
+            items = list(items)
+            if pos is None:
+                positions = dict(positions)
+                positions[item["product_ref"]] = len(items)
+                items.append(item)
+            else:
+                items[pos] = item
+        elif op == "delete":
+            pos = positions.get(entry["product_ref"])
+            if pos is None:
+                return
+            items = items[:pos] + items[pos + 1:]
+            positions = _positions_of(items)
+        else:
+            raise KeyError(op)
+        # Swap in the new bucket; readers holding the old objects are unaffected
+        category = dict(self._data.get(data_type, {}))
+        category[bucket] = items
+        self._data = {**self._data, data_type: category}
+        self._index[(data_type, bucket)] = (items, positions)
+
+    # -- compaction --------------------------------------------------------
+
+    @property
+    def journal_entries(self) -> int:
+        return self._journal_entries
+
+    def compact(self) -> None:
+        """Fold the journal into a new base snapshot.
+
+        Holds the cross-process file lock so no entry is appended between
+        writing the snapshot and truncating the journal.
+        """
+        with self._lock, self._file_lock():
+            self.refresh()
+            if self._journal_entries == 0:
+                return
+            folded = self._journal_entries
+            _atomic_write(self.snapshot_path, json.dumps(self._data, ensure_ascii=False, indent=2))
+            _atomic_write(self.journal_path, "")
+            self._journal_entries = 0
+            self._journal_offset = 0
+            self._files_signature = self._signature()
+        logger.info("Catalog journal compacted", extra={"data": {"folded_entries": folded}})
+
+
+def _positions_of(items: List[Dict]) -> Dict:
+    """product_ref -> position; items without a product_ref are not addressable"""
+    return {item["product_ref"]: pos for pos, item in enumerate(items) if item.get("product_ref") is not None}
+
+
+def _build_index(data: Dict) -> Dict:
+    """Index every bucket of a freshly loaded snapshot, dropping duplicate
+    product_refs (first one wins) so each ref addresses exactly one item"""
+    index = {}
+    for data_type in CATEGORIES:
+        category = data.get(data_type)
+        if not isinstance(category, dict):
+            continue
+        for bucket, items in category.items():
+            unique, seen = [], set()
+            for item in items:
+                ref = item.get("product_ref")
+                if ref is not None:
+                    if ref in seen:
+                        continue
+                    seen.add(ref)
+                unique.append(item)
+            if len(unique) != len(items):
+                logger.warning("Dropped %d duplicate product_refs in %s/%s", len(items) - len(unique),
+                               data_type, bucket)
+                category[bucket] = unique
+            index[(data_type, bucket)] = (unique, _positions_of(unique))
+    return index
+
+
+def _atomic_write(path: str, text: str) -> None:
+    """Write via a temp file in the same directory, then rename into place"""
+    dir_name = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=dir_name, suffix=".tmp", text=True)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as tmp:
+            tmp.write(text)
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
@@ -0,0 +1,117 @@
+import gzip
+
+try:  # optional: enables "br" when the brotli package is installed
+    import brotli
+except ImportError:  # pragma: no cover - depends on environment
+    brotli = None
+
+from etag_index import ENCODING_ETAG_SUFFIXES
+
+
+def negotiate_encoding(accept_encoding: str) -> str:
+    """Pick "br", "gzip" or "" from an Accept-Encoding header"""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[token] = q
+
+    def q_of(name):
+        return accepted.get(name, accepted.get("*", 0.0))
+
+    if brotli is not None and q_of("br") > 0 and q_of("br") >= q_of("gzip"):
+        return "br"
+    if q_of("gzip") > 0:
+        return "gzip"
+    return ""
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+
+def _suffix_etag(headers: list, encoding: str) -> list:
+    """Give each encoded representation its own strong ETag"""
+    suffix = ENCODING_ETAG_SUFFIXES[encoding]
+    out = []
+    for name, value in headers:
+        if name.lower() == b"etag" and value.endswith(b'"'):
+            value = value[:-1] + suffix.encode("latin-1") + b'"'
+        out.append((name, value))
+    return out
+
+
+class CompressionMiddleware:
+    """ASGI middleware that gzip/brotli-encodes buffered responses.
+
+    Only complete (non-streaming) bodies of at least ``minimum_size`` bytes are
+    compressed; streaming responses pass through untouched.
+    """
+
+    def __init__(self, app, minimum_size: int = 500):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept = ""
+        for name, value in scope.get("headers", []):
+            if name == b"accept-encoding":
+                accept = value.decode("latin-1")
+                break
+        encoding = negotiate_encoding(accept)
+        if not encoding:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                if message["status"] == 304:
+                    message = dict(message, headers=_suffix_etag(message.get("headers", []), encoding))
+                    passthrough = True
+                    await send(message)
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            headers = list(start_message.get("headers", []))
+            already_encoded = any(n.lower() == b"content-encoding" for n, _ in headers)
+            if message.get("more_body", False) or already_encoded or len(body) < self.minimum_size:
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            compressed = _compress(body, encoding)
+            headers = [(n, v) for n, v in headers if n.lower() != b"content-length"]
+            headers = _suffix_etag(headers, encoding)
+            headers += [
+                (b"content-encoding", encoding.encode("latin-1")),
+                (b"content-length", str(len(compressed)).encode("latin-1")),
+                (b"vary", b"Accept-Encoding"),
+            ]
+            await send(dict(start_message, headers=headers))
+            await send({"type": "http.response.body", "body": compressed, "more_body": False})
+
+        await self.app(scope, receive, send_wrapper)
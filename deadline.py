@@ -0,0 +1,108 @@
+import contextvars
+import math
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional
+
+from app_logging import get_logger
+from profiling import profile_thread
+
+logger = get_logger(__name__)
+
+# Default per-request latency budget; 0 disables deadlines
+REQUEST_SLO_MS = float(os.getenv("REQUEST_SLO_MS", "5000"))
+# Upper bound for budgets requested through the header
+REQUEST_SLO_MAX_MS = float(os.getenv("REQUEST_SLO_MAX_MS", "30000"))
+DEADLINE_HEADER = "x-request-deadline-ms"
+
+# Stage thresholds (seconds of remaining budget)
+NER_MIN_S = float(os.getenv("DEADLINE_NER_MIN_MS", "1500")) / 1000.0
+WEATHER_MIN_S = float(os.getenv("DEADLINE_WEATHER_MIN_MS", "800")) / 1000.0
+RANK_FULL_S = float(os.getenv("DEADLINE_RANK_FULL_MS", "300")) / 1000.0
+# Budget kept back for the stages after a timed one
+RESERVE_S = float(os.getenv("DEADLINE_RESERVE_MS", "300")) / 1000.0
+# Keywords scored per item when ranking runs late
+RANK_MAX_KEYWORDS = int(os.getenv("DEADLINE_RANK_MAX_KEYWORDS", "5"))
+
+
+class Deadline:
+    """Remaining time budget of one request, plus the degradations applied
+    to stay within it"""
+
+    def __init__(self, budget_s: float):
+        self.budget_s = budget_s
+        self.expires_at = time.monotonic() + budget_s
+        self.degradations: List[str] = []
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    def has(self, seconds: float) -> bool:
+        """Whether at least ``seconds`` of budget are left"""
+        return self.remaining() >= seconds
+
+    def degrade(self, name: str) -> None:
+        if name not in self.degradations:
+            self.degradations.append(name)
+            logger.info("Degraded: %s", name, extra={"data": {"degradation": name,
+                                                             "remaining_ms": round(self.remaining() * 1000)}})
+
+
+def deadline_from_headers(headers) -> Optional[Deadline]:
+    """Budget from the X-Request-Deadline-Ms header, else REQUEST_SLO_MS.
+
+    Only REQUEST_SLO_MS=0 disables deadlines; header values that are not a
+    positive finite number are ignored, and valid ones are capped at
+    REQUEST_SLO_MAX_MS, so clients cannot switch the server SLO off.
+    """
+    if REQUEST_SLO_MS <= 0:
+        return None
+    budget_ms = REQUEST_SLO_MS
+    raw = headers.get(DEADLINE_HEADER)
+    if raw:
+        try:
+            requested = float(raw)
+        except ValueError:
+            requested = math.nan
+        if math.isfinite(requested) and requested > 0:
+            budget_ms = min(requested, REQUEST_SLO_MAX_MS)
+    return Deadline(budget_ms / 1000.0)
+
+
+def _profiled(func, *args):
+    with profile_thread():
+        return func(*args)
+
+
+class BoundedExecutor:
+    """Thread pool for deadline-bounded stages that refuses work when full.
+
+    A stage abandoned on timeout keeps its thread busy until it really
+    finishes, so slots are only freed then. ``try_submit`` returns None
+    instead of queueing, letting the caller take its fast path right away
+    rather than waiting behind abandoned work.
+    """
+
+    def __init__(self, max_workers: int, name: str):
+        self.max_workers = max(1, max_workers)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(self.max_workers)
+        self.rejected = 0
+
+    def try_submit(self, func, *args) -> Optional[Future]:
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            return None
+        try:
+            # The caller's context: request ID for logs, request profile
+            future = self._executor.submit(contextvars.copy_context().run, _profiled, func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,292 @@
+"""Golden-output equivalence harness for retrieval and location engines.
+
+Runs a reference and a candidate pipeline side by side over a generated
+catalog and text query set. Each pipeline resolves the query's location
+(location engine), then selects items per category (retrieval engine). For
+every query the harness compares the resolved location and the top-3
+``product_ref``s per category, and reports the differences plus per-engine
+timings. Exits non-zero on any difference that is not tolerated, so it can
+gate a new engine before it becomes the default:
+
+    python equivalence_harness.py --candidate cached --queries 5000
+    python equivalence_harness.py --candidate mypkg.engines:fast_extract --tolerate order
+    python equivalence_harness.py --reference golden --candidate-location spacy
+
+``--reference golden`` compares against outputs recorded from the baseline
+implementation (``tests/golden/retrieval_baseline.json``) instead of running
+a reference engine, so refactors of the reference path are gated too.
+
+A retrieval engine is ``async def engine(json_data, location, keywords,
+data_type) -> list`` and a location engine is ``def engine(text) ->
+Optional[str]`` (plain or async functions, or ``module:function``). Built-in
+retrieval engines: ``reference``, ``cached``. Built-in location engines:
+``given`` (the location the query was generated for), ``fast``,
+``locationtagger``, ``spacy``. Queries carry keyword lists as RAKE would
+produce them, so NLTK is not needed.
+"""
+import argparse
+import asyncio
+import hashlib
+import importlib
+import inspect
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+from user_keywords_ext import (
+    ADULT_KEYWORDS, BUDGET_CHEAP_KEYWORDS, BUDGET_EXPENSIVE_KEYWORDS, CHILD_KEYWORDS, FAMILY_KEYWORDS,
+    MONTH_KEYWORDS, PARTNER_KEYWORDS, SOLO_KEYWORDS, data_extractor_with_rake, filter_cache,
+)
+
+CATEGORIES = ("Hotels", "Activities", "Restaurants", "Shopping")
+LOCATIONS = ("paris", "london", "rome")
+MONTHS = ["January", "February", "March", "April", "May", "June", "July",
+          "August", "September", "October", "November", "December"]
+NEIGHBORHOODS = ["Marais", "Montmartre", "Bastille", "Latin Quarter", "Saint-Germain",
+                 "Champs-Élysées", "Opéra", "Belleville", "Eiffel Tower", "Louvre"]
+REVIEW_WORDS = ["quiet", "friendly staff", "great breakfast", "rooftop view", "spacious rooms",
+                "close to metro", "romantic", "kids club", "pool", "spa", "clean", "noisy street"]
+FEATURES = ["Wi-Fi", "pool", "spa", "gym", "restaurant", "bar", "family rooms", "parking"]
+TEMPLATES = ["{keywords} in {location}", "Planning a trip to {location}: {keywords}",
+             "{location} {keywords}", "What should I book in {location}? {keywords}"]
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tests", "golden", "retrieval_baseline.json")
+
+
+# -- engines ------------------------------------------------------------------
+
+async def reference_engine(json_data, location, keywords, data_type):
+    """Today's behaviour: uncached cascade + keyword ranking"""
+    return await data_extractor_with_rake(json_data, location, "", data_type, extracted_keywords=keywords)
+
+
+async def cached_engine(json_data, location, keywords, data_type):
+    """Same pipeline with the intent-keyed filter cache"""
+    return await data_extractor_with_rake(json_data, location, "", data_type,
+                                          catalog_version="harness", extracted_keywords=keywords)
+
+
+BUILTIN_ENGINES = {"reference": reference_engine, "cached": cached_engine}
+
+
+def fast_location_engine(text):
+    from location_ner import fast_location
+    return fast_location(text, LOCATIONS)
+
+
+def locationtagger_engine(text):
+    from location_ner import _locationtagger_location
+    return _locationtagger_location(text)
+
+
+def spacy_engine(text):
+    from location_ner import extract_location
+    return extract_location(text)
+
+
+# "given" (None) uses the location recorded with the query
+BUILTIN_LOCATION_ENGINES = {"given": None, "fast": fast_location_engine,
+                            "locationtagger": locationtagger_engine, "spacy": spacy_engine}
+
+
+def load_engine(spec: str, builtins: Dict = BUILTIN_ENGINES) -> Optional[Callable]:
+    if spec in builtins:
+        return builtins[spec]
+    module_name, _, attr = spec.partition(":")
+    if not attr:
+        raise SystemExit(f"engine must be one of {sorted(builtins)} or module:function, got {spec!r}")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+# -- generation ---------------------------------------------------------------
+
+def generate_catalog(rng: random.Random, items_per_bucket: int) -> Dict:
+    data = {}
+    ref = 0
+    for data_type in CATEGORIES:
+        data[data_type] = {}
+        for location in LOCATIONS:
+            items = []
+            for _ in range(rng.randint(0, items_per_bucket)):
+                ref += 1
+                hood = rng.choice(NEIGHBORHOODS)
+                items.append({
+                    "product_ref": f"GEN_{ref:06d}",
+                    "title": f"{rng.choice(['Hotel', 'Maison', 'Café', 'Atelier', 'Tour'])} {hood} {ref}",
+                    "location": location.upper(),
+                    "address": f"{rng.randint(1, 120)} Rue {rng.choice(NEIGHBORHOODS)}, {hood}, {location.title()}",
+                    "type_of_visit": rng.choice(["Family", "Solo", "Couple", "Adults", ""]),
+                    "time_of_year": ", ".join(rng.sample(MONTHS, rng.randint(0, 5))),
+                    "product_subtype_category": rng.choice(["Destination_top_response", "Hidden_gem", ""]),
+                    "budget": rng.choice(["£", "££", "£££", ""]),
+                    "features_amenities": "; ".join(rng.sample(FEATURES, rng.randint(0, 4))),
+                    "languages_spoken": rng.choice(["English, French", "French", "English, Italian"]),
+                    "review_1": " and ".join(rng.sample(REVIEW_WORDS, rng.randint(0, 3))),
+                    "review_2": rng.choice(REVIEW_WORDS + [""]),
+                    "product_affiliate_deeplink": f"https://example.com/{ref}",
+                })
+            data[data_type][f"{location}_{data_type.lower()}"] = items
+    return data
+
+
+def generate_queries(rng: random.Random, count: int) -> List[Dict]:
+    pools = [FAMILY_KEYWORDS, CHILD_KEYWORDS, SOLO_KEYWORDS, PARTNER_KEYWORDS, ADULT_KEYWORDS,
+             BUDGET_CHEAP_KEYWORDS, BUDGET_EXPENSIVE_KEYWORDS, MONTH_KEYWORDS,
+             [n.lower() for n in NEIGHBORHOODS], REVIEW_WORDS, [f.lower() for f in FEATURES],
+             ["trip", "visit", "weekend", "hotel", "best", "near"]]
+    queries = []
+    for _ in range(count):
+        keywords = [rng.choice(rng.choice(pools)) for _ in range(rng.randint(0, 8))]
+        location = rng.choice(LOCATIONS)
+        text = rng.choice(TEMPLATES).format(keywords=", ".join(keywords) or "ideas", location=location.title())
+        queries.append({"text": text, "location": location, "keywords": keywords})
+    return queries
+
+
+def catalog_digest(catalog: Dict) -> str:
+    return hashlib.sha1(json.dumps(catalog, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def load_golden(path: str):
+    """Catalog, queries and recorded outputs of a golden file"""
+    with open(path, "r", encoding="utf-8") as f:
+        golden = json.load(f)
+    catalog = generate_catalog(random.Random(golden["seed"]), golden["items"])
+    if catalog_digest(catalog) != golden["catalog_sha1"]:
+        raise SystemExit(f"{path} was recorded against a different generated catalog; re-record it")
+    return catalog, golden["cases"]
+
+
+def golden_engine(cases: List[Dict]) -> Callable:
+    """Retrieval engine replaying recorded outputs for the recorded location"""
+    recorded = {}
+    for case in cases:
+        for data_type, refs in case["expected"].items():
+            recorded[(case["location"], tuple(case["keywords"]), data_type)] = refs
+
+    def engine(json_data, location, keywords, data_type):
+        key = ((location or "").lower(), tuple(keywords), data_type)
+        return [{"product_ref": ref} for ref in recorded.get(key, [])]
+    return engine
+
+
+# -- comparison ---------------------------------------------------------------
+
+async def _call(engine, *args):
+    result = engine(*args)
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+def _refs(items) -> List:
+    return [item.get("product_ref") for item in items]
+
+
+async def _pipeline(location_engine, engine, catalog, query, timings):
+    """(resolved location, {data_type: refs}) for one query"""
+    start = time.perf_counter()
+    if location_engine is None:
+        location = query["location"]
+    else:
+        location = ((await _call(location_engine, query["text"])) or "").lower() or None
+    results = {}
+    for data_type in CATEGORIES:
+        if location is None:
+            results[data_type] = []
+            continue
+        args = (catalog, location, list(query["keywords"]), data_type)
+        results[data_type] = _refs(await _call(engine, *args))
+    timings.append(time.perf_counter() - start)
+    return location, results
+
+
+async def run(reference, candidate, catalog, queries, tolerate: str, show: int,
+              reference_location=None, candidate_location=None) -> int:
+    timings = {"reference": [], "candidate": []}
+    diffs = []
+    for index, query in enumerate(queries):
+        exp_location, expected = await _pipeline(reference_location, reference, catalog, query, timings["reference"])
+        act_location, actual = await _pipeline(candidate_location, candidate, catalog, query, timings["candidate"])
+        if exp_location != act_location:
+            diffs.append({"query": index, "kind": "location", "text": query["text"],
+                          "expected": exp_location, "actual": act_location})
+        for data_type in CATEGORIES:
+            if expected[data_type] == actual[data_type]:
+                continue
+            kind = "order" if sorted(map(str, expected[data_type])) == sorted(map(str, actual[data_type])) else "selection"
+            diffs.append({"query": index, "data_type": data_type, "kind": kind,
+                          "keywords": query["keywords"], "location": act_location,
+                          "expected": expected[data_type], "actual": actual[data_type]})
+
+    print(f"{len(queries)} queries x {len(CATEGORIES)} categories (location + top-3 refs)")
+    for name, samples in timings.items():
+        ordered = sorted(samples)
+        p95 = ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+        print(f"  {name:<10} total {sum(ordered):8.3f}s  mean {statistics.mean(ordered) * 1e6:9.1f}us  "
+              f"p95 {p95 * 1e6:9.1f}us")
+    by_kind = {kind: [d for d in diffs if d["kind"] == kind] for kind in ("location", "selection", "order")}
+    print(f"differences: {len(by_kind['location'])} location, {len(by_kind['selection'])} selection, "
+          f"{len(by_kind['order'])} order-only")
+    for d in diffs[:show]:
+        print("  " + json.dumps(d, ensure_ascii=False))
+
+    failing = by_kind["location"] + by_kind["selection"] + (by_kind["order"] if tolerate != "order" else [])
+    print("PASS" if not failing else "FAIL")
+    return 1 if failing else 0
+
+
+async def record_golden(engine, catalog, queries, seed: int, items: int, path: str) -> None:
+    """Write the outputs of ``engine`` for the given-location pipeline"""
+    cases = []
+    for query in queries:
+        _, expected = await _pipeline(None, engine, catalog, query, [])
+        cases.append(dict(query, expected=expected))
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"seed": seed, "items": items, "catalog_sha1": catalog_digest(catalog), "cases": cases},
+                  f, ensure_ascii=False, separators=(",", ":"))
+        f.write("\n")
+    print(f"Recorded {len(cases)} cases -> {path}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reference", default="reference", help="retrieval engine, or 'golden'")
+    parser.add_argument("--candidate", default="cached")
+    parser.add_argument("--reference-location", default="given")
+    parser.add_argument("--candidate-location", default="given")
+    parser.add_argument("--golden", default=GOLDEN_PATH, help="golden file used by --reference golden")
+    parser.add_argument("--record-golden", metavar="PATH", help="record the reference engine's outputs and exit")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--items", type=int, default=40, help="max items per location and category")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tolerate", choices=["none", "order"], default="none",
+                        help="documented difference class that does not fail the gate")
+    parser.add_argument("--show", type=int, default=10, help="differences to print")
+    args = parser.parse_args()
+
+    reference_location = load_engine(args.reference_location, BUILTIN_LOCATION_ENGINES)
+    candidate_location = load_engine(args.candidate_location, BUILTIN_LOCATION_ENGINES)
+    if args.reference == "golden":
+        catalog, queries = load_golden(args.golden)
+        reference = golden_engine(queries)
+    else:
+        rng = random.Random(args.seed)
+        catalog = generate_catalog(rng, args.items)
+        queries = generate_queries(rng, args.queries)
+        reference = load_engine(args.reference)
+    if args.record_golden:
+        asyncio.run(record_golden(reference, catalog, queries, args.seed, args.items, args.record_golden))
+        return
+    code = asyncio.run(run(reference, load_engine(args.candidate), catalog, queries, args.tolerate, args.show,
+                           reference_location, candidate_location))
+    print(f"filter cache: {filter_cache.stats()}")
+    sys.exit(code)
+
+
+if __name__ == "__main__":
+    main()
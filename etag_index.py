@@ -0,0 +1,99 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from shared_cache import SharedCache, shared_cache
+
+# Content-coded representations get a suffixed ETag (see compression.py)
+ENCODING_ETAG_SUFFIXES = {"gzip": "-gzip", "br": "-br"}
+
+
+def normalize_input(user_input: str) -> str:
+    """Normalized form of the query; the prompt embeds exactly this text"""
+    return user_input.strip()
+
+
+def request_key(normalized_input: str, version: str) -> str:
+    return hashlib.sha256(f"{version}\0{normalized_input}".encode("utf-8")).hexdigest()
+
+
+def seed_for(normalized_input: str) -> int:
+    """Stable RNG seed so emoji choice depends only on the input"""
+    return int.from_bytes(hashlib.sha256(normalized_input.encode("utf-8")).digest()[:8], "big")
+
+
+def compute_etag(body: bytes) -> str:
+    """Strong ETag over the exact response bytes"""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match evaluation (weak comparison, as RFC 9110 requires)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        for suffix in ENCODING_ETAG_SUFFIXES.values():
+            if candidate.endswith(suffix + '"'):
+                candidate = candidate[: -len(suffix) - 1] + '"'
+                break
+        if candidate == etag:
+            return True
+    return False
+
+
+class DigestIndex:
+    """Bounded LRU of request key -> ETag for recently served responses.
+
+    Entries expire after ``ttl`` seconds so that inputs outside the key (the
+    weather value) are re-evaluated periodically. Backed by the host-wide
+    shared tier, so a 304 can be answered by any worker.
+    """
+
+    def __init__(self, max_entries: int = 4096, ttl: float = 600.0,
+                 shared: Optional[SharedCache] = shared_cache):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.shared = shared
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                etag, stored_at = entry
+                if time.monotonic() - stored_at <= self.ttl:
+                    self._entries.move_to_end(key)
+                    return etag
+                del self._entries[key]
+        if self.shared is None:
+            return None
+        shared = self.shared.get(f"etag:{key}")
+        if not isinstance(shared, dict) or "etag" not in shared or "stored_at" not in shared:
+            return None
+        # Keep the original age so the entry expires at the same time everywhere
+        age = max(0.0, time.time() - shared["stored_at"])
+        self._put_local(key, shared["etag"], time.monotonic() - age)
+        return shared["etag"]
+
+    def put(self, key: str, etag: str) -> None:
+        self._put_local(key, etag, time.monotonic())
+        if self.shared is not None:
+            self.shared.set(f"etag:{key}", {"etag": etag, "stored_at": time.time()}, self.ttl)
+
+    def _put_local(self, key: str, etag: str, stored_at: float) -> None:
+        with self._lock:
+            self._entries[key] = (etag, stored_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,92 @@
+"""Local stand-in for the OpenWeatherMap current-weather endpoint.
+
+Used to exercise the weather circuit breaker and hedging with injected
+latency and errors:
+
+    python fake_weather_server.py --port 8081 --latency 3 --jitter 1 --error-rate 0.2
+    WEATHER_API_URL=http://127.0.0.1:8081/data/2.5/weather uvicorn main:app
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterable
+from urllib.parse import parse_qs, urlparse
+
+
+class FakeWeatherHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        time.sleep(max(0.0, server.latency + random.uniform(-server.jitter, server.jitter)))
+        query = parse_qs(urlparse(self.path).query)
+        city = (query.get("q") or [""])[0]
+
+        if random.random() < server.error_rate:
+            status, body = 503, {"cod": 503, "message": "injected failure"}
+        elif not city or city.lower() in server.unknown:
+            status, body = 404, {"cod": "404", "message": "city not found"}
+        else:
+            temp = round(random.uniform(-5, 30), 2)
+            status, body = 200, {"name": city, "main": {"temp": temp, "feels_like": round(temp - 2, 2)}}
+
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeWeatherServer(ThreadingHTTPServer):
+    """Fault settings are plain attributes, so tests can change them live"""
+
+    daemon_threads = True
+
+    def __init__(self, address, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, unknown: Iterable[str] = ()):
+        super().__init__(address, FakeWeatherHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.unknown = {c.lower() for c in unknown}
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/data/2.5/weather"
+
+
+def start_in_thread(**settings) -> FakeWeatherServer:
+    """Serve on a free local port from a daemon thread; stop with shutdown()"""
+    server = FakeWeatherServer(("127.0.0.1", 0), **settings)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="base response delay in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- random delay in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of 503 responses")
+    parser.add_argument("--unknown", default="", help="comma-separated cities that return 404")
+    args = parser.parse_args()
+
+    unknown = [c.strip() for c in args.unknown.split(",") if c.strip()]
+    server = FakeWeatherServer((args.host, args.port), latency=args.latency, jitter=args.jitter,
+                               error_rate=args.error_rate, unknown=unknown)
+    print(f"Fake weather API on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
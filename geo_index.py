@@ -0,0 +1,382 @@
+"""Spatial index for proximity queries ("hotel near the Eiffel Tower").
+
+Offline, ``build`` geocodes every catalog address plus the landmark and
+neighborhood names into stored coordinates (``catalog_geo.json``). Any
+geopy-compatible geocoder works; the default is ``FixtureGeocoder``, which
+resolves from ``geo_fixtures.json`` so the build needs no network:
+
+    python geo_index.py build [--catalog ./test_data.json] [--out ./catalog_geo.json]
+    python geo_index.py near "hotel near the eiffel tower" --location paris --type Hotels
+
+At request time nothing is geocoded: the anchor named in the query is looked
+up in the stored table and a KD-tree per catalog bucket returns the nearest
+items in logarithmic time.
+"""
+import argparse
+import heapq
+import json
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from app_logging import get_logger
+
+logger = get_logger(__name__)
+
+GEO_INDEX_PATH = os.getenv("GEO_INDEX_PATH", "./catalog_geo.json")
+GEO_FIXTURES_PATH = os.getenv("GEO_FIXTURES_PATH", "./geo_fixtures.json")
+# Items considered "near" an anchor
+GEO_NEAR_N = int(os.getenv("GEO_NEAR_N", "10"))
+GEO_NEAR_KM = float(os.getenv("GEO_NEAR_KM", "2.0"))
+
+KM_PER_DEG_LAT = 110.574
+KM_PER_DEG_LON = 111.320
+
+
+def normalize_place(text: str) -> str:
+    """Case-, accent- and punctuation-insensitive form of a place name"""
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(c for c in text if not unicodedata.combining(c)).casefold()
+    text = text.replace("œ", "oe").replace("æ", "ae")
+    return " ".join(re.sub(r"[^\w]+", " ", text).split())
+
+
+def _mention_pattern(names) -> Optional[re.Pattern]:
+    """Regex matching any of ``names`` as whole words, longest first"""
+    names = sorted({n for n in names if n}, key=len, reverse=True)
+    if not names:
+        return None
+    return re.compile(r"\b(?:" + "|".join(re.escape(n) for n in names) + r")\b")
+
+
+# -- offline geocoding ----------------------------------------------------------
+
+class FixtureGeocoder:
+    """geopy-compatible geocoder backed by a local fixtures file.
+
+    ``geocode(query)`` resolves, most precise first: a known exact address, an
+    address component naming a landmark or neighborhood, a landmark mentioned
+    anywhere, the postcode, a neighborhood mentioned anywhere, the city.
+    """
+
+    def __init__(self, path: str = GEO_FIXTURES_PATH):
+        with open(path, "r", encoding="utf-8") as f:
+            fixtures = json.load(f)
+        self.addresses = {normalize_place(a): tuple(p) for a, p in fixtures.get("addresses", {}).items()}
+        self.postcodes = {code: tuple(p) for code, p in fixtures.get("postcodes", {}).items()}
+        self.places = {}
+        self.patterns = {}
+        for kind in ("landmarks", "neighborhoods", "cities"):
+            table = {}
+            for place in fixtures.get(kind, []):
+                for name in [place["name"]] + place.get("aliases", []):
+                    table.setdefault(normalize_place(name), place)
+            self.places[kind] = table
+            self.patterns[kind] = _mention_pattern(table)
+
+    def _candidates(self, query: str) -> List[Tuple[str, str, Tuple[float, float]]]:
+        """(name, precision, (lat, lon)) in order of preference"""
+        found = []
+        normalized = normalize_place(query)
+        if normalized in self.addresses:
+            found.append((query, "address", self.addresses[normalized]))
+        for component in query.split(","):
+            component = normalize_place(component)
+            for kind, precision in (("landmarks", "landmark"), ("neighborhoods", "neighborhood")):
+                place = self.places[kind].get(component)
+                if place:
+                    found.append((place["name"], precision, (place["lat"], place["lon"])))
+        pattern = self.patterns["landmarks"]
+        for match in (pattern.finditer(normalized) if pattern else ()):
+            place = self.places["landmarks"][match.group(0)]
+            found.append((place["name"], "landmark", (place["lat"], place["lon"])))
+        for code in re.findall(r"\b\d{5}\b", query):
+            if code in self.postcodes:
+                found.append((code, "postcode", self.postcodes[code]))
+        for kind, precision in (("neighborhoods", "neighborhood"), ("cities", "city")):
+            pattern = self.patterns[kind]
+            for match in (pattern.finditer(normalized) if pattern else ()):
+                place = self.places[kind][match.group(0)]
+                found.append((place["name"], precision, (place["lat"], place["lon"])))
+        return found
+
+    def geocode(self, query: str, exactly_one: bool = True, timeout=None, **kwargs):
+        """Same contract as ``geopy.geocoders.base.Geocoder.geocode``"""
+        from geopy.location import Location
+
+        locations, seen = [], set()
+        for name, precision, point in self._candidates(query):
+            if (name, point) in seen:
+                continue
+            seen.add((name, point))
+            locations.append(Location(name, point, {"name": name, "precision": precision}))
+        if exactly_one:
+            return locations[0] if locations else None
+        return locations or None
+
+
+def _precision(location) -> str:
+    raw = getattr(location, "raw", None) or {}
+    return raw.get("precision") or raw.get("type") or raw.get("class") or "geocoder"
+
+
+def build_geo_index(catalog_data: Dict, geocoder, anchor_source: Optional[Dict] = None) -> Dict:
+    """Geocode every catalog item address, plus the anchor (landmark and
+    neighborhood) names when ``anchor_source`` fixtures are given"""
+    from catalog_store import CATEGORIES
+
+    items, unresolved = {}, []
+    for data_type in CATEGORIES:
+        for bucket, bucket_items in catalog_data.get(data_type, {}).items():
+            coords = {}
+            for item in bucket_items:
+                ref, address = item.get("product_ref"), str(item.get("address") or "").strip()
+                if not ref or ref in coords:
+                    continue
+                location = geocoder.geocode(address, exactly_one=True) if address else None
+                if location is None:
+                    unresolved.append({"data_type": data_type, "product_ref": ref, "address": address})
+                    continue
+                coords[ref] = [round(location.latitude, 6), round(location.longitude, 6), _precision(location)]
+            items.setdefault(data_type, {})[bucket] = coords
+
+    anchors = []
+    for kind in ("landmarks", "neighborhoods"):
+        for place in (anchor_source or {}).get(kind, []):
+            location = geocoder.geocode(f"{place['name']}, {place['city'].title()}", exactly_one=True)
+            if location is None:
+                unresolved.append({"anchor": place["name"]})
+                continue
+            anchors.append({
+                "name": place["name"], "aliases": place.get("aliases", []), "kind": kind[:-1],
+                "city": place["city"], "lat": round(location.latitude, 6), "lon": round(location.longitude, 6),
+            })
+    return {"geocoder": type(geocoder).__name__, "items": items, "anchors": anchors, "unresolved": unresolved}
+
+
+# -- runtime index ----------------------------------------------------------------
+
+class KDTree:
+    """Static 2-d tree over (x, y, payload) points in kilometres"""
+
+    def __init__(self, points: List[Tuple[float, float, object]]):
+        self.size = len(points)
+        self.root = self._build(list(points), 0)
+
+    def _build(self, points, axis):
+        if not points:
+            return None
+        points.sort(key=lambda p: p[axis])
+        mid = len(points) // 2
+        return (points[mid], axis,
+                self._build(points[:mid], 1 - axis),
+                self._build(points[mid + 1:], 1 - axis))
+
+    def nearest(self, x: float, y: float, n: int, max_dist: Optional[float] = None) -> List[Tuple[float, object]]:
+        """Up to ``n`` (distance, payload) pairs, closest first"""
+        if n <= 0 or self.root is None:
+            return []
+        bound = math.inf if max_dist is None else max_dist * max_dist
+        heap = []  # max-heap of (-dist2, visit order, payload)
+        stack = [self.root]
+        visited = 0
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            point, axis, left, right = node
+            d2 = (point[0] - x) ** 2 + (point[1] - y) ** 2
+            if d2 <= bound:
+                visited += 1
+                heapq.heappush(heap, (-d2, visited, point[2]))
+                if len(heap) > n:
+                    heapq.heappop(heap)
+                if len(heap) == n:
+                    bound = min(bound, -heap[0][0])
+            delta = (x, y)[axis] - point[axis]
+            near, far = (left, right) if delta < 0 else (right, left)
+            if delta * delta <= bound:
+                stack.append(far)
+            stack.append(near)
+        return sorted((math.sqrt(-d2), payload) for d2, _, payload in heap)
+
+
+class Proximity:
+    """Catalog items near the anchor named in a query: product_ref -> km"""
+
+    def __init__(self, anchor: Dict, distances: Dict[str, float]):
+        self.anchor = anchor
+        self.name = anchor["name"]
+        self.distances = distances
+        self._names = {normalize_place(n) for n in [anchor["name"]] + anchor.get("aliases", [])}
+
+    def covers(self, keyword: str) -> bool:
+        """Whether a matched keyword already names the anchor"""
+        keyword = normalize_place(keyword)
+        return any(name in keyword for name in self._names)
+
+
+class SpatialIndex:
+    """Stored coordinates plus lazily built KD-trees per catalog bucket.
+
+    Trees only include items still present in ``catalog`` and are rebuilt
+    when its version changes; the coordinates file is reloaded when it
+    changes on disk. A missing file disables proximity ranking.
+    """
+
+    def __init__(self, path: str = GEO_INDEX_PATH, catalog=None):
+        self.path = path
+        self.catalog = catalog
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._items: Dict = {}
+        self._anchors: Dict[str, List[Dict]] = {}
+        self._patterns: Dict[str, re.Pattern] = {}
+        self._trees: Dict[Tuple[str, str], Tuple[KDTree, float]] = {}
+        self._trees_version = None
+
+    def ensure_loaded(self) -> None:
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            if self._mtime is not False:
+                logger.info("No spatial index at %s; proximity ranking disabled", self.path)
+                self._mtime = False
+                self._items, self._anchors, self._patterns, self._trees = {}, {}, {}, {}
+            return
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            with open(self.path, "r", encoding="utf-8") as f:
+                built = json.load(f)
+            anchors = {}
+            for anchor in built.get("anchors", []):
+                anchors.setdefault(anchor["city"].lower(), []).append(anchor)
+            self._items = built.get("items", {})
+            self._anchors = {}
+            for city, entries in anchors.items():
+                names = self._anchors[city] = {}
+                for anchor in entries:
+                    for name in [anchor["name"]] + anchor.get("aliases", []):
+                        names.setdefault(normalize_place(name), anchor)
+            self._patterns = {city: _mention_pattern(names) for city, names in self._anchors.items()}
+            self._trees = {}
+            self._mtime = mtime
+            logger.info("Loaded spatial index %s (%d anchors)", self.path, sum(map(len, anchors.values())))
+
+    def find_anchor(self, text: str, location: Optional[str]) -> Optional[Dict]:
+        """First landmark or neighborhood of ``location`` named in ``text``"""
+        self.ensure_loaded()
+        if not location:
+            return None
+        city = location.lower()
+        pattern = self._patterns.get(city)
+        match = pattern.search(normalize_place(text)) if pattern else None
+        return self._anchors[city][match.group(0)] if match else None
+
+    def _tree(self, data_type: str, location: str) -> Optional[Tuple[KDTree, float]]:
+        from catalog_store import bucket_key
+
+        bucket = bucket_key(data_type, location)
+        version = self.catalog.version if self.catalog is not None else None
+        with self._lock:
+            if version != self._trees_version:
+                self._trees, self._trees_version = {}, version
+            cached = self._trees.get((data_type, bucket))
+            if cached is not None:
+                return cached
+            coords = self._items.get(data_type, {}).get(bucket, {})
+            if self.catalog is not None:
+                present = {item.get("product_ref") for item in self.catalog.data.get(data_type, {}).get(bucket, [])}
+                coords = {ref: c for ref, c in coords.items() if ref in present}
+            if not coords:
+                return None
+            lat0 = math.radians(sum(c[0] for c in coords.values()) / len(coords))
+            tree = KDTree([(c[1] * KM_PER_DEG_LON * math.cos(lat0), c[0] * KM_PER_DEG_LAT, ref)
+                           for ref, c in coords.items()])
+            self._trees[(data_type, bucket)] = (tree, lat0)
+            return tree, lat0
+
+    def nearest(self, location: str, data_type: str, lat: float, lon: float,
+                n: int = GEO_NEAR_N, max_km: Optional[float] = GEO_NEAR_KM) -> List[Tuple[str, float]]:
+        """Up to ``n`` (product_ref, km) of the bucket, closest first"""
+        self.ensure_loaded()
+        found = self._tree(data_type, location)
+        if found is None:
+            return []
+        tree, lat0 = found
+        x, y = lon * KM_PER_DEG_LON * math.cos(lat0), lat * KM_PER_DEG_LAT
+        return [(ref, round(km, 3)) for km, ref in tree.nearest(x, y, n, max_km)]
+
+    def proximity(self, anchor: Optional[Dict], location: str, data_type: str,
+                  n: int = GEO_NEAR_N, max_km: Optional[float] = GEO_NEAR_KM) -> Optional[Proximity]:
+        if not anchor or not location:
+            return None
+        return Proximity(anchor, dict(self.nearest(location, data_type, anchor["lat"], anchor["lon"], n, max_km)))
+
+    def stats(self) -> dict:
+        return {"loaded": bool(self._mtime), "anchors": sum(map(len, self._anchors.values())),
+                "trees": len(self._trees)}
+
+
+# -- CLI --------------------------------------------------------------------------
+
+def _build(args) -> None:
+    from catalog_store import CatalogStore
+
+    catalog = CatalogStore(args.catalog, args.journal)
+    with open(args.fixtures, "r", encoding="utf-8") as f:
+        fixtures = json.load(f)
+    built = build_geo_index(catalog.data, FixtureGeocoder(args.fixtures), fixtures)
+    tmp = args.out + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(built, f, ensure_ascii=False, separators=(",", ":"))
+        f.write("\n")
+    os.replace(tmp, args.out)
+
+    precisions = Counter(c[2] for buckets in built["items"].values()
+                         for coords in buckets.values() for c in coords.values())
+    print(f"{sum(precisions.values())} items geocoded {dict(precisions)}, "
+          f"{len(built['anchors'])} anchors, {len(built['unresolved'])} unresolved -> {args.out}")
+    for entry in built["unresolved"]:
+        print(f"  unresolved: {json.dumps(entry, ensure_ascii=False)}")
+
+
+def _near(args) -> None:
+    index = SpatialIndex(args.index)
+    anchor = index.find_anchor(args.text, args.location)
+    if anchor is None:
+        raise SystemExit(f"no known landmark or neighborhood of {args.location!r} in {args.text!r}")
+    print(f"anchor: {anchor['name']} ({anchor['lat']}, {anchor['lon']})")
+    for ref, km in index.nearest(args.location, args.type, anchor["lat"], anchor["lon"], args.n, args.max_km):
+        print(f"  {ref:<12} {km:6.2f} km")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="geocode the catalog into the coordinates file")
+    build.add_argument("--catalog", default=os.getenv("CATALOG_SNAPSHOT", "./test_data.json"))
+    build.add_argument("--journal", default=os.getenv("CATALOG_JOURNAL", "./catalog_journal.jsonl"))
+    build.add_argument("--fixtures", default=GEO_FIXTURES_PATH)
+    build.add_argument("--out", default=GEO_INDEX_PATH)
+    near = commands.add_parser("near", help="nearest items to the landmark named in a text")
+    near.add_argument("text")
+    near.add_argument("--location", default="paris")
+    near.add_argument("--type", default="Hotels")
+    near.add_argument("-n", type=int, default=GEO_NEAR_N)
+    near.add_argument("--max-km", type=float, default=None)
+    near.add_argument("--index", default=GEO_INDEX_PATH)
+    args = parser.parse_args()
+    if args.command == "build":
+        _build(args)
+    else:
+        _near(args)
+
+
+if __name__ == "__main__":
+    main()
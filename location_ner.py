@@ -0,0 +1,262 @@
+"""Trimmed spaCy location NER.
+
+Drop-in alternative to ``locationtagger.find_locations`` for the single
+location the app needs. Only the NER-relevant components of en_core_web_sm
+are loaded (no parser, tagger, attribute ruler or lemmatizer), the pipeline
+is loaded once per process, and batches go through ``nlp.pipe``. GPE/LOC
+entities are classified with the gazetteer shipped with locationtagger, so
+the result keeps the city -> country -> region precedence of
+``extract_locations_from_text``.
+
+Select it with ``LOCATION_NER_ENGINE=spacy``. Compare both engines:
+
+    python location_ner.py --compare queries.jsonl [--field body] [--limit 500]
+"""
+import argparse
+import importlib.util
+import json
+import os
+import re
+import sqlite3
+import statistics
+import time
+from functools import lru_cache
+from typing import Iterable, List, Optional
+
+from app_logging import get_logger
+
+logger = get_logger(__name__)
+
+# "locationtagger" (default, original behaviour) or "spacy"
+LOCATION_NER_ENGINE = os.getenv("LOCATION_NER_ENGINE", "locationtagger").lower()
+
+SPACY_MODEL = "en_core_web_sm"
+# Components the location entities do not depend on
+EXCLUDED_COMPONENTS = ["parser", "tagger", "attribute_ruler", "lemmatizer", "senter"]
+LOCATION_LABELS = {"GPE", "LOC"}
+
+
+@lru_cache(maxsize=1)
+def get_nlp():
+    """Load the trimmed pipeline once per process"""
+    import spacy
+
+    start = time.perf_counter()
+    nlp = spacy.load(SPACY_MODEL, exclude=EXCLUDED_COMPONENTS)
+    logger.info("Loaded %s with %s in %.0f ms", SPACY_MODEL, nlp.pipe_names,
+                (time.perf_counter() - start) * 1000)
+    return nlp
+
+
+@lru_cache(maxsize=1)
+def _gazetteer():
+    """(cities, countries, regions) name sets, lowercased.
+
+    Read from locationtagger's bundled locationdata.db without importing the
+    package (which would pull in its own NLP stack).
+    """
+    cities, countries, regions = set(), set(), set()
+    spec = importlib.util.find_spec("locationtagger")
+    db_path = None
+    if spec is not None and spec.submodule_search_locations:
+        db_path = os.path.join(list(spec.submodule_search_locations)[0], "locationdata.db")
+    if db_path and os.path.exists(db_path):
+        try:
+            conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+            try:
+                for city, country, region in conn.execute(
+                    "SELECT city_name, country_name, subdivision_name FROM locations"
+                ):
+                    if city:
+                        cities.add(city.lower())
+                    if country:
+                        countries.add(country.lower())
+                    if region:
+                        regions.add(region.lower())
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            logger.exception("Could not read location gazetteer %s", db_path)
+    else:
+        logger.warning("locationtagger gazetteer not found; treating every place as a city")
+
+    try:
+        import pycountry
+        countries.update(c.name.lower() for c in pycountry.countries)
+    except ImportError:
+        pass
+    return cities, countries, regions
+
+
+def _pick(entities: Iterable[str]) -> Optional[str]:
+    """First city, else first country, else first region"""
+    cities, countries, regions = _gazetteer()
+    entities = list(entities)
+    if not (cities or countries or regions):
+        return entities[0] if entities else None
+    for kind in (cities, countries, regions):
+        for name in entities:
+            if name.lower() in kind:
+                return name
+    return None
+
+
+def _entities(doc) -> List[str]:
+    return [ent.text for ent in doc.ents if ent.label_ in LOCATION_LABELS]
+
+
+def extract_location(text: str) -> Optional[str]:
+    """Single-text equivalent of extract_locations_from_text"""
+    return _pick(_entities(get_nlp()(text)))
+
+
+def extract_locations_batch(texts: List[str], batch_size: int = 64) -> List[Optional[str]]:
+    """Batch version using nlp.pipe"""
+    return [_pick(_entities(doc)) for doc in get_nlp().pipe(texts, batch_size=batch_size)]
+
+
+def load_gazetteer() -> None:
+    """Read the gazetteer ahead of the first fast-path lookup (blocking)"""
+    _gazetteer()
+
+
+def _capitalized_phrases(text: str, max_words: int = 3) -> List[str]:
+    """Phrases of up to ``max_words`` consecutive capitalized words, in text
+    order, longest first at each position"""
+    runs, run, end = [], [], 0
+    for word in re.finditer(r"[^\W\d_][\w'-]*", text):
+        # A lowercase word or punctuation ends the run
+        if run and (not word.group(0)[0].isupper() or text[end:word.start()].strip()):
+            runs.append(run)
+            run = []
+        if word.group(0)[0].isupper():
+            run.append(word.group(0))
+            end = word.end()
+    if run:
+        runs.append(run)
+    phrases = []
+    for run in runs:
+        for i in range(len(run)):
+            for n in range(min(max_words, len(run) - i), 0, -1):
+                phrases.append(" ".join(run[i:i + n]))
+    return phrases
+
+
+def gazetteer_location(text: str) -> Optional[str]:
+    """Dictionary lookup standing in for NER: capitalized phrases checked
+    against the gazetteer with the city -> country -> region precedence"""
+    gazetteer = _gazetteer()
+    phrases = _capitalized_phrases(text)
+    for kind in gazetteer:
+        for phrase in phrases:
+            if phrase.lower() in kind:
+                return phrase
+    return None
+
+
+def fast_location(text: str, known_locations: Iterable[str]) -> Optional[str]:
+    """Cheap fallback when there is no time for NER: the known location
+    (e.g. catalog locations) mentioned earliest in the text, else a
+    gazetteer match, so places outside the catalog still resolve"""
+    lowered = text.lower()
+    best = None
+    for name in known_locations:
+        match = re.search(r"\b" + re.escape(name.lower()) + r"\b", lowered)
+        if match and (best is None or match.start() < best[0]):
+            best = (match.start(), name)
+    return best[1].title() if best else gazetteer_location(text)
+
+
+def _locationtagger_location(text: str) -> Optional[str]:
+    import locationtagger
+
+    entity = locationtagger.find_locations(text=text)
+    if entity.cities:
+        return entity.cities[0]
+    if entity.countries:
+        return entity.countries[0]
+    if entity.regions:
+        return entity.regions[0]
+    return None
+
+
+def _load_texts(path: str, field: Optional[str], limit: int) -> List[str]:
+    texts = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = line
+            if isinstance(record, dict):
+                keys = [field] if field else ["user_input", "query", "body", "text"]
+                record = next((record[k] for k in keys if record.get(k)), "")
+            if record:
+                texts.append(str(record))
+            if len(texts) >= limit:
+                break
+    return texts
+
+
+def _summary(name: str, latencies: List[float]) -> str:
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+    return (f"{name:<24} mean {statistics.mean(ordered) * 1000:8.2f} ms   "
+            f"p50 {statistics.median(ordered) * 1000:8.2f} ms   p95 {p95 * 1000:8.2f} ms")
+
+
+def compare(texts: List[str], batch_size: int) -> None:
+    """Print per-query latency of both engines, batch throughput and agreement"""
+    # Load models outside the timed region
+    get_nlp()
+    _gazetteer()
+    _locationtagger_location("Paris")
+
+    lt_results, lt_times = [], []
+    for text in texts:
+        start = time.perf_counter()
+        lt_results.append(_locationtagger_location(text))
+        lt_times.append(time.perf_counter() - start)
+
+    sp_results, sp_times = [], []
+    for text in texts:
+        start = time.perf_counter()
+        sp_results.append(extract_location(text))
+        sp_times.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    batch_results = extract_locations_batch(texts, batch_size=batch_size)
+    batch_elapsed = time.perf_counter() - start
+
+    agree = sum(1 for a, b in zip(lt_results, sp_results) if (a or "").lower() == (b or "").lower())
+    print(f"{len(texts)} texts")
+    print(_summary("locationtagger", lt_times))
+    print(_summary("spacy (per text)", sp_times))
+    print(f"{'spacy (nlp.pipe)':<24} {batch_elapsed / len(texts) * 1000:8.2f} ms/text   "
+          f"{len(texts) / batch_elapsed:8.1f} texts/s")
+    print(f"agreement with locationtagger: {agree}/{len(texts)} ({agree / len(texts):.1%})")
+    if batch_results != sp_results:
+        print("warning: batched and per-text spaCy results differ")
+    for text, a, b in zip(texts, lt_results, sp_results):
+        if (a or "").lower() != (b or "").lower():
+            print(f"  differs: locationtagger={a!r} spacy={b!r} :: {text[:80]!r}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--compare", metavar="JSONL", required=True, help="queries to run through both engines")
+    parser.add_argument("--field", default=None)
+    parser.add_argument("--limit", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+    texts = _load_texts(args.compare, args.field, args.limit)
+    if not texts:
+        raise SystemExit("no texts to compare")
+    compare(texts, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
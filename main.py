@@ -1,21 +1,124 @@
 from fastapi import FastAPI,HTTPException
-import requests
 from fastapi.responses import JSONResponse
 import os
 from dotenv import load_dotenv
 import asyncio
-import locationtagger
-import nltk
-from rake_nltk import Rake
-import tempfile
-import locationtagger
+from contextlib import asynccontextmanager
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
-from user_keywords_ext import *
+# Heavy NLP/HTTP dependencies (nltk, rake_nltk, locationtagger/spaCy, requests)
+# are imported lazily inside the functions that use them, so the app can
+# start listening and answer /healthz before they are loaded.
+from user_keywords_ext import (
+    FilterCacheWarmer, data_extractor_with_rake, filter_cache, get_user_keywords, preload_nlp,
+)
 import random
+from fastapi import Request
+from app_logging import setup_logging, get_logger, request_id_var, safe_request_id
+from admission import AdmissionRejected, admission_from_env
+from etag_index import (
+    DigestIndex, compute_etag, etag_matches, normalize_input, request_key, seed_for,
+)
+from catalog_store import CATEGORIES, CatalogStore
+from weather import (
+    NEUTRAL_WEATHER_TEXT, WeatherNotFound, fetch_weather_text, get_weather, weather_cache, weather_upstream,
+)
+from resilience import CircuitOpenError
+from location_ner import LOCATION_NER_ENGINE, extract_location, fast_location, load_gazetteer
+import deadline as deadlines
+from deadline import BoundedExecutor, deadline_from_headers
+from shared_cache import MISS, TieredCache
+from geo_index import GEO_INDEX_PATH, SpatialIndex
+from weather_prefetch import LocationPopularity, prefetcher_from_env
+from fastapi.responses import Response
+from compression import CompressionMiddleware
+from profiling import ProfilingMiddleware
+from prompt_format import compact_item, format_items
 load_dotenv()
+setup_logging()
+logger = get_logger(__name__)
+
+# Bounds concurrent NLP/retrieval work (run on its own thread pool); excess load is shed with a 503
+admission = admission_from_env()
+
+# Deterministic mode: output depends only on input, catalog and weather, so
+# responses carry a strong ETag and repeat polls can be answered with a 304.
+DETERMINISTIC_RESPONSES = os.getenv("DETERMINISTIC_RESPONSES", "0") == "1"
+etag_index = DigestIndex(
+    max_entries=int(os.getenv("ETAG_INDEX_SIZE", "4096")),
+    ttl=float(os.getenv("ETAG_INDEX_TTL_S", "600")),
+)
+
+# Catalog = test_data.json snapshot + append-only journal of admin changes
+catalog = CatalogStore(
+    snapshot_path=os.getenv("CATALOG_SNAPSHOT", "./test_data.json"),
+    journal_path=os.getenv("CATALOG_JOURNAL", "./catalog_journal.jsonl"),
+)
+CATALOG_COMPACT_AFTER = int(os.getenv("CATALOG_COMPACT_AFTER", "200"))
+CATALOG_COMPACT_INTERVAL_S = float(os.getenv("CATALOG_COMPACT_INTERVAL_S", "60"))
 
-app = FastAPI()
+# Filter results are memoized per catalog version: re-warm whenever it changes
+FILTER_CACHE_WARM = os.getenv("FILTER_CACHE_WARM", "1") == "1"
+filter_warmer = FilterCacheWarmer(catalog.snapshot)
+
+# Offline-built coordinates; proximity ranking without geocoding per request
+geo_index = SpatialIndex(GEO_INDEX_PATH, catalog)
+
+# Location NER under a deadline; bounded so abandoned calls cannot pile up.
+# One slot per admitted request, so a request only takes the fast path up
+# front when abandoned calls still hold slots.
+ner_executor = BoundedExecutor(int(os.getenv("NER_MAX_WORKERS", str(admission.max_concurrency))), "ner")
+
+# Query text -> resolved location, shared across workers on this host
+location_cache = TieredCache("location", ttl=float(os.getenv("LOCATION_CACHE_TTL_S", "86400")))
+
+# Which locations users ask about; drives background weather prefetching
+location_popularity = LocationPopularity(
+    half_life=float(os.getenv("WEATHER_POPULARITY_HALF_LIFE_S", "3600")),
+)
+
+
+def rewarm_filter_cache() -> None:
+    """Warm the filter cache in the background if the catalog version changed"""
+    if FILTER_CACHE_WARM and filter_warmer.stale(catalog.version):
+        asyncio.get_running_loop().run_in_executor(None, filter_warmer.warm)
+
+
+async def catalog_compactor():
+    """Fold the journal into a new snapshot once it grows past the threshold"""
+    while True:
+        await asyncio.sleep(CATALOG_COMPACT_INTERVAL_S)
+        try:
+            await asyncio.to_thread(catalog.refresh)
+            if catalog.journal_entries >= CATALOG_COMPACT_AFTER:
+                await asyncio.to_thread(catalog.compact)
+            rewarm_filter_cache()
+        except Exception:
+            logger.exception("Catalog compaction failed")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Load the catalog, start background tasks, optionally warm the NLP stack"""
+    await asyncio.to_thread(catalog.load)
+    await asyncio.to_thread(geo_index.ensure_loaded)
+    # Fast-path location lookups must not pay for reading the gazetteer
+    asyncio.get_running_loop().run_in_executor(None, load_gazetteer)
+    rewarm_filter_cache()
+    tasks = [asyncio.create_task(catalog_compactor())]
+    if os.getenv("WEATHER_API") and os.getenv("WEATHER_PREFETCH", "1") == "1":
+        prefetcher = prefetcher_from_env(os.getenv("WEATHER_API"), location_popularity)
+        tasks.append(asyncio.create_task(prefetcher.run()))
+    if os.getenv("PRELOAD_NLP", "0") == "1":
+        asyncio.get_running_loop().run_in_executor(None, preload_nlp)
+    yield
+    for task in tasks:
+        task.cancel()
+    admission.close()
+    ner_executor.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -25,6 +128,93 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Negotiated gzip (and br when the brotli package is installed)
+app.add_middleware(CompressionMiddleware, minimum_size=int(os.getenv("COMPRESSION_MIN_BYTES", "500")))
+
+# cProfile + tracemalloc for requests with X-Profile (admin) or sampled by PROFILE_SAMPLE_RATE
+app.add_middleware(ProfilingMiddleware)
+
+
+@app.middleware("http")
+async def request_id_middleware(request: Request, call_next):
+    """Bind a request ID to every log record emitted while handling the request"""
+    request_id = safe_request_id(request.headers.get("X-Request-ID"))
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness probe. Must stay free of NLP/HTTP imports."""
+    return {"status": "ok"}
+
+
+@app.get("/admission/stats")
+async def admission_stats():
+    """Queue depth and rejection counters for sizing workers"""
+    return admission.stats()
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit/miss counters of the filter result cache"""
+    return {"filter": filter_cache.stats(), "location": location_cache.stats(), "geo": geo_index.stats()}
+
+
+@app.get("/weather/stats")
+async def weather_stats():
+    """Circuit state and latency of the weather upstream"""
+    return weather_upstream.stats()
+
+
+def require_admin(request: Request) -> None:
+    """Admin routes need X-Admin-Token to match ADMIN_TOKEN (disabled if unset)"""
+    token = os.getenv("ADMIN_TOKEN")
+    if not token or request.headers.get("x-admin-token") != token:
+        raise HTTPException(status_code=403, detail="admin token required")
+
+
+@app.put("/admin/catalog/{data_type}/{location}/{product_ref}")
+async def upsert_catalog_item(data_type: str, location: str, product_ref: str, item: dict, request: Request):
+    """Insert or replace a single catalog item"""
+    require_admin(request)
+    if data_type not in CATEGORIES:
+        raise HTTPException(status_code=404, detail=f"Unknown data type: {data_type}")
+    item = dict(item, product_ref=product_ref)
+    created = await asyncio.to_thread(catalog.upsert, data_type, location, item)
+    rewarm_filter_cache()
+    return JSONResponse(
+        content={"status": "created" if created else "updated", "version": catalog.version},
+        status_code=201 if created else 200,
+    )
+
+
+@app.delete("/admin/catalog/{data_type}/{location}/{product_ref}")
+async def delete_catalog_item(data_type: str, location: str, product_ref: str, request: Request):
+    """Remove a single catalog item"""
+    require_admin(request)
+    if data_type not in CATEGORIES:
+        raise HTTPException(status_code=404, detail=f"Unknown data type: {data_type}")
+    deleted = await asyncio.to_thread(catalog.delete, data_type, location, product_ref)
+    if not deleted:
+        raise HTTPException(status_code=404, detail=f"{product_ref} not found")
+    rewarm_filter_cache()
+    return {"status": "deleted", "version": catalog.version}
+
+
+@app.post("/admin/catalog/compact")
+async def compact_catalog(request: Request):
+    """Fold the journal into a new snapshot now"""
+    require_admin(request)
+    await asyncio.to_thread(catalog.compact)
+    rewarm_filter_cache()
+    return {"status": "compacted", "version": catalog.version}
+
+
 class UserInput(BaseModel):
     user_input: str
 
@@ -34,18 +224,22 @@ class ResponseStorage(BaseModel):
     model_response: str
 
 
-async def prompt_sender(user_input: str):
+async def prompt_sender(user_input: str, structured: bool = False, deadline=None):
     try:
         # Initialize the Apis class with environment variables
         promt = DemoApis(
-            weather_api_key=os.getenv("WEATHER_API")
+            weather_api_key=os.getenv("WEATHER_API"),
+            deterministic=DETERMINISTIC_RESPONSES,
         )
         # Get the final response asynchronously
-        final = await promt.final_response(str(user_input))
+        final = await promt.final_response(str(user_input), deadline=deadline)
+        if structured:
+            # Selected items travel separately from the prompt text
+            return {"prompt": final, "items": promt.selected_items}
         return final
 
     except Exception as e:
-        
+        logger.exception("prompt_sender failed")
         raise HTTPException(status_code=500, detail="Something went wrong while processing your request.")
 
 
@@ -53,76 +247,80 @@ async def prompt_sender(user_input: str):
 
 
 @app.post("/test_api_2/")
-async def test_api_system_p(user_input: UserInput):
+async def test_api_system_p(user_input: UserInput, request: Request):
     """
     Minimal endpoint: takes user input and returns the prompt_sender response.
     """
     # Validate input
     if not user_input.user_input or not user_input.user_input.strip():
         raise HTTPException(status_code=400, detail="user_input cannot be empty")
+
+    # ?format=structured returns {"prompt", "items"} instead of the bare prompt
+    structured = request.query_params.get("format") == "structured"
+
+    cache_key = None
+    if_none_match = request.headers.get("if-none-match")
+    # Latency budget for this request, handed to every pipeline stage
+    deadline = deadline_from_headers(request.headers)
+
+    # Pick up catalog changes written by other workers (a reload after another
+    # worker compacted parses the whole snapshot: off the event loop)
+    await asyncio.to_thread(catalog.refresh)
+    rewarm_filter_cache()
+    if DETERMINISTIC_RESPONSES:
+        variant = "structured\0" if structured else ""
+        cache_key = request_key(variant + normalize_input(user_input.user_input), catalog.version)
+        # The index reads through to the sqlite shared tier: off the event loop
+        known_etag = await asyncio.to_thread(etag_index.get, cache_key)
+        if known_etag and etag_matches(if_none_match, known_etag):
+            # Client already holds this exact response; skip the pipeline
+            return Response(status_code=304, headers={"ETag": known_etag})
     
     try:
-        # Process prompt
-        response = await prompt_sender(user_input.user_input)
+        # Process prompt (admission control sheds load when saturated)
+        # The pipeline runs on the admission pool so CPU-bound stages do not block the loop
+        response = await admission.run(prompt_sender, user_input.user_input, structured=structured, deadline=deadline)
+        degradations = list(deadline.degradations) if deadline else []
         
         # Return result directly
-        return JSONResponse(
+        result = JSONResponse(
             content={
                 "status": "success",
-                "response": response
+                "response": response,
+                "degradations": degradations,
             },
             status_code=200
         )
+        if cache_key is not None and not degradations:
+            etag = compute_etag(result.body)
+            await asyncio.to_thread(etag_index.put, cache_key, etag)
+            if etag_matches(if_none_match, etag):
+                return Response(status_code=304, headers={"ETag": etag})
+            result.headers["ETag"] = etag
+        return result
     
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Server busy ({e.reason}), please retry later.",
+            headers={"Retry-After": str(e.retry_after)},
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 
-import json
 class DemoApis():
-    def __init__(self, weather_api_key: str):
+    def __init__(self, weather_api_key: str, deterministic: bool = False):
         """Initialize chatbot with API keys and configuration"""
          
         self.weather_api_key = weather_api_key
+        # Seed per-input randomness so identical inputs render identically
+        self.deterministic = deterministic
+        # Top-3 items per section chosen by the last all_apis() call
+        self.selected_items = {}
 
-    async def all_apis(self,user_input:str)-> str:
-
-        async def _read_json_file_s3(path: str = "./test_data.json") -> dict:
-            """Read JSON file from S3 asynchronously. Returns {} if missing/invalid."""
-            def _read():
-                try:
-                    if not os.path.exists(path):
-                        return {}
-                    with open(path, "r", encoding="utf-8") as f:
-                        data = f.read()
-                    return json.loads(data)
-                except Exception:
-                    return {}
-            return await asyncio.to_thread(_read)
-
-        async def _write_json_file_s3(data: dict, path: str = "./test_data.json") -> None:
-            """Write JSON file to S3 atomically (via local temp + upload)."""
-
-            _PARTNERS_CACHE_LOCK = asyncio.Lock()
-            def _write():
-                dir_name = os.path.dirname(path) or "."
-                fd, tmp_path = tempfile.mkstemp(dir=dir_name, suffix=".tmp", text=True)
-                try:
-                    with os.fdopen(fd, "w", encoding="utf-8") as tmp:
-                        json.dump(data, tmp, ensure_ascii=False, indent=2)
-                        tmp.flush()
-                        os.fsync(tmp.fileno())
-                    os.replace(tmp_path, path)
-                finally:
-                    if os.path.exists(tmp_path):
-                        try:
-                            os.remove(tmp_path)
-                        except OSError:
-                            pass
-
-            async with _PARTNERS_CACHE_LOCK:
-                await asyncio.to_thread(_write)
+    async def all_apis(self,user_input:str, deadline=None)-> str:
 
         async def get_weather_and_store_once_for_paris(location: str) -> str:
             """Fetch weather data for Paris and store it once in a JSON file. Reuse the stored data on subsequent requests."""
@@ -134,74 +332,37 @@ class DemoApis():
                 # For Paris, check if the weather data is already stored
                 paris_key = "paris_weather_latest"
                 
-                # Try reading the existing JSON file from S3
-                existing_data = await _read_json_file_s3(path="./test_data.json")
+                # Try reading the stored value from the catalog
+                stored = catalog.get_value(paris_key)
 
-                if paris_key in existing_data:
+                if stored is not None:
                     # If data for Paris exists, return the stored data
-                    return existing_data[paris_key]
+                    return stored
 
                 # If the data doesn't exist, fetch the weather data from the OpenWeatherMap API
                 try:
-                    url = "http://api.openweathermap.org/data/2.5/weather"
-                    params = {
-                        "q": "Paris",
-                        "appid": self.weather_api_key,
-                        "units": "metric"
-                    }
-                    response = requests.get(url, params=params, timeout=10)
-
-                    if response.status_code == 200:
-                        weather_data = response.json()
-                        weather_text = (
-    f"The current weather in {location.capitalize()} is {weather_data['main']['temp']}°C, "
-    f"with a 'feels like' temperature of {weather_data['main']['feels_like']}°C."
-)
-
+                    weather_text = await fetch_weather_text(location, self.weather_api_key)
 
-                        # Add the new weather data for Paris
-                        existing_data[paris_key] = weather_text
+                    # Store it through the catalog journal (no full-file rewrite)
+                    await asyncio.to_thread(catalog.set_value, paris_key, weather_text)
 
-                        # Save the updated data back to S3 (or local storage)
-                        await _write_json_file_s3(existing_data,path="./test_data.json")
+                    return weather_text
 
-                        return weather_text
+                except CircuitOpenError:
+                    return NEUTRAL_WEATHER_TEXT
 
-                    else:
-                        return "❌ Weather data for Paris not found. Please try again later."
+                except WeatherNotFound:
+                    return "❌ Weather data for Paris not found. Please try again later."
 
                 except Exception as e:
                     return f"❌ Failed to fetch weather data for Paris: {str(e)}"
 
             else:
-                # For any other location, always fetch new data from OpenWeatherMap API
-                try:
-                    url = "http://api.openweathermap.org/data/2.5/weather"
-                    params = {
-                        "q": location.capitalize(),
-                        "appid": self.weather_api_key,
-                        "units": "metric"
-                    }
-                    response = requests.get(url, params=params, timeout=10)
-
-                    if response.status_code == 200:
-                        weather_data = response.json()
-                        
-
-                        weather_text = (
-    f"The current weather in {location.capitalize()} is {weather_data['main']['temp']}°C, "
-    f"with a 'feels like' temperature of {weather_data['main']['feels_like']}°C."
-)
-
-                        return weather_text
-
-                    else:
-                        return f"❌ Weather data for {location.capitalize()} not found. Please try again later."
-
-                except Exception as e:
-                    return f"❌ Failed to fetch weather data for {location.capitalize()}: {str(e)}"
+                # Any other location: TTL-cached, kept warm by the prefetcher
+                return await get_weather(location, self.weather_api_key)
 
         def ensure_nltk_resources():
+            import nltk
             # Put a local nltk_data folder in your project root
             nltk_data_dir = os.path.join(os.getcwd(), "nltk_data")
             os.makedirs(nltk_data_dir, exist_ok=True)
@@ -232,6 +393,11 @@ class DemoApis():
                     nltk.download(download_id, download_dir=nltk_data_dir, quiet=True)
 
         def extract_locations_from_text(text):
+            if LOCATION_NER_ENGINE == "spacy":
+                # Trimmed, cached spaCy NER with the same precedence
+                return extract_location(text)
+            import locationtagger
+            from rake_nltk import Rake
             # Extract keywords using RAKE
             ensure_nltk_resources()
             rake = Rake()
@@ -251,21 +417,84 @@ class DemoApis():
                 return entity.regions[0]  # Just return the first region if found
             return None  # Return None if no locations detected
         
-        location = extract_locations_from_text(user_input)
-        print(f"\n\n\n \nExtracted location: {location}\n\n\n\n\n\n\n")
-        weather =  await get_weather_and_store_once_for_paris(location)
+        async def location_within_deadline(text):
+            """NER if there is time for it, else match known catalog locations"""
+            if deadline is None:
+                return extract_locations_from_text(text), True
+            future = None
+            if deadline.has(deadlines.NER_MIN_S):
+                # None when saturated with slow (possibly abandoned) calls: take the fast path
+                future = ner_executor.try_submit(extract_locations_from_text, text)
+            if future is not None:
+                try:
+                    found = await asyncio.wait_for(
+                        asyncio.wrap_future(future),
+                        timeout=deadline.remaining() - deadlines.RESERVE_S,
+                    )
+                    return found, True
+                except asyncio.TimeoutError:
+                    pass
+            deadline.degrade("location_fast_path")
+            return fast_location(text, catalog.locations()), False
+
+        async def weather_within_deadline(location):
+            """Live weather if there is time for it, else the last known value"""
+            if not location:
+                # Nothing to look up (no place named, or not resolved in time)
+                return NEUTRAL_WEATHER_TEXT
+            if deadline is None:
+                return await get_weather_and_store_once_for_paris(location)
+            if deadline.has(deadlines.WEATHER_MIN_S):
+                try:
+                    return await asyncio.wait_for(
+                        get_weather_and_store_once_for_paris(location),
+                        timeout=deadline.remaining() - deadlines.RESERVE_S,
+                    )
+                except asyncio.TimeoutError:
+                    pass
+            if location.lower() == "paris":
+                stale = catalog.get_value("paris_weather_latest")
+            else:
+                stale = weather_cache.get_stale(location)
+            deadline.degrade("weather_stale" if stale else "weather_skipped")
+            return stale or NEUTRAL_WEATHER_TEXT
+
+        location_key = f"{LOCATION_NER_ENGINE}\0{user_input}"
+        location = location_cache.get(location_key)
+        if location is MISS:
+            location, complete = await location_within_deadline(user_input)
+            # Do not cache fast-path guesses
+            if complete:
+                location_cache.set(location_key, location)
+        logger.info("Extracted location: %s", location, extra={"data": {"location": location}})
+        if location:
+            location_popularity.record(location)
+        weather =  await weather_within_deadline(location)
         # Convert your complex data structure to detailed text format with all information
         paris_gov = """
 - [Paris.fr](https://www.paris.fr/)
 - [France Visas](https://france-visas.gouv.fr/)
 """
 
-        json_data = await _read_json_file_s3(path="./test_data.json")
+        # Data and version from the same instant: filter results are memoized per version
+        json_data, version = catalog.snapshot()
         # print(f"\n\n\n \nJSON Data Loaded: {json_data}\n\n\n\n\n\n\n")
-        hotels =  await data_extractor_with_rake(json_data,location, user_input, data_type="Hotels")
-        activities =  await data_extractor_with_rake(json_data, location,user_input,data_type="Activities")
-        restaurants =  await data_extractor_with_rake(json_data,location,user_input, data_type="Restaurants")
-        shopping =  await data_extractor_with_rake(json_data,location,user_input, data_type="Shopping")
+        # RAKE once per request; filter results are memoized per catalog version + intent
+        keywords = await get_user_keywords(user_input)
+        max_rank_keywords = None
+        if deadline is not None and not deadline.has(deadlines.RANK_FULL_S):
+            max_rank_keywords = deadlines.RANK_MAX_KEYWORDS
+            if len(keywords) > max_rank_keywords:
+                deadline.degrade("keywords_capped")
+        # Landmark or neighborhood named in the query -> nearby items per category
+        anchor = geo_index.find_anchor(user_input, location)
+        if anchor:
+            logger.info("Proximity anchor: %s", anchor["name"], extra={"data": {"anchor": anchor["name"]}})
+        proximity = {dt: geo_index.proximity(anchor, location, dt) for dt in CATEGORIES} if anchor else {}
+        hotels =  await data_extractor_with_rake(json_data,location, user_input, data_type="Hotels", catalog_version=version, extracted_keywords=keywords, max_rank_keywords=max_rank_keywords, proximity=proximity.get("Hotels"))
+        activities =  await data_extractor_with_rake(json_data, location,user_input,data_type="Activities", catalog_version=version, extracted_keywords=keywords, max_rank_keywords=max_rank_keywords, proximity=proximity.get("Activities"))
+        restaurants =  await data_extractor_with_rake(json_data,location,user_input, data_type="Restaurants", catalog_version=version, extracted_keywords=keywords, max_rank_keywords=max_rank_keywords, proximity=proximity.get("Restaurants"))
+        shopping =  await data_extractor_with_rake(json_data,location,user_input, data_type="Shopping", catalog_version=version, extracted_keywords=keywords, max_rank_keywords=max_rank_keywords, proximity=proximity.get("Shopping"))
 
         extracted_shopping = [
         {
@@ -319,15 +548,28 @@ class DemoApis():
         SEC_7 = ["✈️", "🌍", "🧳", "📍", "🚆", "🗺️", "🏝️", "🏞️", "⛱️", "🛫",]
 
 
+        self.selected_items = {
+            "hotels": [compact_item(i) for i in extracted_hotels[0:3]],
+            "activities": [compact_item(i) for i in extracted_activities[0:3]],
+            "restaurants": [compact_item(i) for i in extracted_restaurants[0:3]],
+            "shopping": [compact_item(i) for i in extracted_shopping[0:3]],
+        }
+        hotels_text = format_items(extracted_hotels[0:3])
+        activities_text = format_items(extracted_activities[0:3])
+        restaurants_text = format_items(extracted_restaurants[0:3])
+        shopping_text = format_items(extracted_shopping[0:3])
+
+        rng = random.Random(seed_for(normalize_input(user_input))) if self.deterministic else random
+
         async def random_emoji_picker():
             return {
-                "SEC_1": random.choice(SEC_1),
-                "SEC_2": random.choice(SEC_2),
-                "SEC_3": random.choice(SEC_3),
-                "SEC_4": random.choice(SEC_4),
-                "SEC_5": random.choice(SEC_5),
-                "SEC_6": random.choice(SEC_6),
-                "SEC_7": random.choice(SEC_7)
+                "SEC_1": rng.choice(SEC_1),
+                "SEC_2": rng.choice(SEC_2),
+                "SEC_3": rng.choice(SEC_3),
+                "SEC_4": rng.choice(SEC_4),
+                "SEC_5": rng.choice(SEC_5),
+                "SEC_6": rng.choice(SEC_6),
+                "SEC_7": rng.choice(SEC_7)
             }
         emojis = await random_emoji_picker()
         # Example usage:
@@ -352,7 +594,7 @@ NEVER output as: [Hotel Name][https://example.com](https://example.com)
 
 OUTPUT ALL 7 SECTIONS:
 
-**{sec_7} Welcome to {location}** 
+**{sec_7} Welcome to {location or 'your destination'}** 
 Greet warmly + address their question in some detail
 
 {sec_1} **How to get to Paris from the UK**
@@ -365,7 +607,7 @@ Greet warmly + address their question in some detail
  BOOK: [Trip.com](https://uk.trip.com/flights/to-paris/airfares-par/)
 
 {sec_2} **Accommodation**
-Output each hotel from {extracted_hotels[0:3]} as:
+Output each hotel from {hotels_text} as:
 **[HOTEL_NAME](HOTEL_URL)**
 Write 2-3 sentences: where it is (use address), arrondissement name, nearby landmarks or metro station, why it appeals to visitors.
 Recent visitors praised the property as outstanding, commenting that "QUOTE_FROM_REVIEW_FIELD"
@@ -373,7 +615,7 @@ Recent visitors praised the property as outstanding, commenting that "QUOTE_FROM
 Output blank line between each hotel.
 
 {sec_3} **While you are there, you may try**
-Output each activity from {extracted_activities[0:3]} as:
+Output each activity from {activities_text} as:
 **[ACTIVITY_NAME](ACTIVITY_URL)**
 Write 2-3 sentences: what the activity offers, location (use address), who should visit, budget level if available.
 Recent visitors praised the activity as outstanding, commenting that "QUOTE_FROM_REVIEW_FIELD"
@@ -381,7 +623,7 @@ Recent visitors praised the activity as outstanding, commenting that "QUOTE_FROM
 Output blank line between each activity.
 
 {sec_4} **Our Dining Recommendations**
-Output each restaurant from {extracted_restaurants[0:3]} as:
+Output each restaurant from {restaurants_text} as:
 **[RESTAURANT_NAME](RESTAURANT_URL)**
 Write 2-3 sentences: location (use address), what type of dining/cuisine, atmosphere, specialties, budget if available.
 Recent visitors praised the restaurant as outstanding, commenting that "QUOTE_FROM_REVIEW_FIELD"
@@ -389,7 +631,7 @@ Recent visitors praised the restaurant as outstanding, commenting that "QUOTE_FR
 Output blank line between each restaurant.
 
 {sec_5} **While you are there, make sure you shop at**
-Output each shop from {extracted_shopping[0:3]} as:
+Output each shop from {shopping_text} as:
 **[SHOP_NAME](SHOP_URL)**
 Nothing else. No description. No additional text.
 
@@ -433,14 +675,14 @@ OUTPUT REQUIREMENTS:
         return system_prompt
     
 
-    async def final_response(self,user_input:str)->str:
+    async def final_response(self,user_input:str, deadline=None)->str:
         """Generate final response based on user input"""
         try:
-            response = await self.all_apis(user_input)
+            response = await self.all_apis(user_input, deadline=deadline)
             # print(f"✅ Response generated successfully: {response}")
             return response
         except Exception as e:
-            print(f"❌ Error generating response: {e}")
+            logger.exception("Error generating response: %s", e)
             return JSONResponse(content={"error": "Failed to generate response."})
        
 
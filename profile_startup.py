@@ -0,0 +1,75 @@
+"""Cold-start import profile for the app.
+
+Runs ``python -X importtime -c "import main"`` in a fresh interpreter and
+reports the slowest modules by cumulative import time.
+
+Usage:
+    python profile_startup.py [--module main] [--top 25] [--preload]
+
+``--preload`` also imports the lazily loaded NLP stack so the two numbers can
+be compared (time-to-first-listen vs. fully warmed).
+"""
+import argparse
+import subprocess
+import sys
+import time
+from typing import List, Tuple
+
+
+def run_importtime(statement: str) -> Tuple[float, List[Tuple[int, int, str]]]:
+    """Run ``statement`` under -X importtime, return (wall seconds, rows)"""
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        text=True,
+    )
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr)
+        raise SystemExit(proc.returncode)
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        # import time:       self [us] |  cumulative | imported package
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+            rows.append((int(self_us), int(cumulative_us), name.rstrip()))
+        except ValueError:
+            continue
+    return wall, rows
+
+
+def report(title: str, wall: float, rows: List[Tuple[int, int, str]], top: int) -> None:
+    top_level = [r for r in rows if not r[2].startswith("  ")]
+    total_us = sum(r[1] for r in top_level)
+    print(f"== {title}")
+    print(f"wall time (interpreter + imports): {wall * 1000:.1f} ms")
+    print(f"total import time:                 {total_us / 1000:.1f} ms")
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for self_us, cumulative_us, name in sorted(rows, key=lambda r: r[1], reverse=True)[:top]:
+        print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {name.strip()}")
+    print()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main", help="module to import (default: main)")
+    parser.add_argument("--top", type=int, default=25, help="number of modules to list")
+    parser.add_argument("--preload", action="store_true", help="also profile with the NLP stack preloaded")
+    args = parser.parse_args()
+
+    wall, rows = run_importtime(f"import {args.module}")
+    report(f"import {args.module}", wall, rows, args.top)
+
+    if args.preload:
+        wall, rows = run_importtime(
+            f"import {args.module}; from user_keywords_ext import preload_nlp; preload_nlp()"
+        )
+        report(f"import {args.module} + preload_nlp()", wall, rows, args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""Opt-in per-request profiling.
+
+A request is profiled when it carries ``X-Profile: 1`` together with a valid
+``X-Admin-Token``, or when it falls inside ``PROFILE_SAMPLE_RATE``. The
+handler runs under cProfile and tracemalloc, and so does every worker thread
+that runs its stages inside ``profile_thread``; results are written to
+``PROFILE_DIR`` as ``<time>_<request_id>.prof`` plus an ``.alloc.txt``
+allocation report, keeping the newest ``PROFILE_KEEP`` profiles.
+
+Summarize captured profiles:
+
+    python profiling.py summarize [--dir profiles] [--top 30] [--sort cumulative]
+"""
+import argparse
+import asyncio
+import contextvars
+import cProfile
+import glob
+import os
+import pstats
+import random
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import List, Optional
+
+from app_logging import get_logger, request_id_var, safe_request_id
+
+logger = get_logger(__name__)
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+
+
+class RequestProfile:
+    """cProfile results of every thread that worked on one request"""
+
+    def __init__(self):
+        self._profiles: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def add(self, profile: cProfile.Profile) -> None:
+        """Record a profile once its thread has disabled it"""
+        with self._lock:
+            self._profiles.append(profile)
+
+    def stats(self) -> pstats.Stats:
+        with self._lock:
+            profiles = list(self._profiles)
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        return stats
+
+
+# Profile of the request being handled, if it is profiled
+request_profile_var: contextvars.ContextVar[Optional[RequestProfile]] = contextvars.ContextVar(
+    "request_profile", default=None
+)
+
+
+@contextmanager
+def profile_thread():
+    """Profile this thread into the current request's profile, if any.
+
+    cProfile only sees the thread that enabled it, so code running a
+    request's stages on a pool thread wraps them in this.
+    """
+    request_profile = request_profile_var.get()
+    if request_profile is None:
+        yield
+        return
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        # Python 3.12+: the request's profiler already sees every thread
+        yield
+        return
+    try:
+        yield
+    finally:
+        profile.disable()
+        request_profile.add(profile)
+
+
+def _write_profile(request_profile: RequestProfile, alloc_snapshot, base_path: str, keep: int) -> None:
+    os.makedirs(os.path.dirname(base_path) or ".", exist_ok=True)
+    request_profile.stats().dump_stats(base_path + ".prof")
+    if alloc_snapshot is not None:
+        with open(base_path + ".alloc.txt", "w", encoding="utf-8") as f:
+            for stat in alloc_snapshot.statistics("lineno")[:50]:
+                f.write(f"{stat}\n")
+    _enforce_retention(os.path.dirname(base_path) or ".", keep)
+
+
+def _enforce_retention(directory: str, keep: int) -> None:
+    """Delete the oldest profiles beyond ``keep``"""
+    profiles = sorted(glob.glob(os.path.join(directory, "*.prof")))
+    for old in profiles[:-keep] if keep > 0 else profiles:
+        for path in (old, old[: -len(".prof")] + ".alloc.txt"):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles selected requests.
+
+    At most one request is profiled at a time. Its event-loop work is
+    profiled here, which also captures whatever else runs on the loop
+    meanwhile; its worker threads are merged in through ``profile_thread``.
+    Threads still running when the response is done (abandoned stages) are
+    left out.
+    """
+
+    def __init__(self, app, directory: str = PROFILE_DIR, sample_rate: float = PROFILE_SAMPLE_RATE,
+                 keep: int = PROFILE_KEEP, admin_token: str = None):
+        self.app = app
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.keep = keep
+        self.admin_token = admin_token if admin_token is not None else os.getenv("ADMIN_TOKEN")
+        self._busy = threading.Lock()
+
+    def _requested(self, scope) -> bool:
+        headers = dict(scope.get("headers", []))
+        if headers.get(b"x-profile") == b"1" and self.admin_token:
+            return headers.get(b"x-admin-token", b"").decode("latin-1") == self.admin_token
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._requested(scope) or not self._busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        now = time.time()
+        # The request ID may come from the client; never let it shape the path
+        rid = safe_request_id(request_id_var.get())
+        name = time.strftime("%Y%m%dT%H%M%S", time.localtime(now)) + f"{int(now * 1000) % 1000:03d}_{rid}"
+        base_path = os.path.join(self.directory, name)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", [])) + [(b"x-profile-id", name.encode("latin-1"))]
+                message = dict(message, headers=headers)
+            await send(message)
+
+        trace_allocs = not tracemalloc.is_tracing()
+        if trace_allocs:
+            tracemalloc.start()
+        request_profile = RequestProfile()
+        token = request_profile_var.set(request_profile)
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profile.disable()
+            request_profile_var.reset(token)
+            request_profile.add(profile)
+            snapshot = tracemalloc.take_snapshot() if trace_allocs else None
+            if trace_allocs:
+                tracemalloc.stop()
+            self._busy.release()
+            try:
+                await asyncio.to_thread(_write_profile, request_profile, snapshot, base_path, self.keep)
+                logger.info("Wrote request profile %s", base_path + ".prof")
+            except OSError:
+                logger.exception("Could not write request profile")
+
+
+def summarize(directory: str, top: int, sort: str) -> None:
+    """Print the top functions aggregated across all captured profiles"""
+    files = sorted(glob.glob(os.path.join(directory, "*.prof")))
+    if not files:
+        print(f"No profiles in {directory}")
+        return
+    stats = pstats.Stats(files[0])
+    for path in files[1:]:
+        stats.add(path)
+    print(f"{len(files)} profiles from {directory}")
+    stats.strip_dirs().sort_stats(sort).print_stats(top)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    summary = sub.add_parser("summarize", help="aggregate captured profiles")
+    summary.add_argument("--dir", default=PROFILE_DIR)
+    summary.add_argument("--top", type=int, default=30)
+    summary.add_argument("--sort", default="cumulative", choices=["cumulative", "tottime", "ncalls"])
+    args = parser.parse_args()
+    summarize(args.dir, args.top, args.sort)
+
+
+if __name__ == "__main__":
+    main()
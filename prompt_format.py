@@ -0,0 +1,31 @@
+import os
+from typing import Dict, List
+
+# "repr" keeps the original Python-dict rendering, "compact" writes one line
+# per item with only the non-empty fields (fewer LLM input tokens).
+PROMPT_ITEM_FORMAT = os.getenv("PROMPT_ITEM_FORMAT", "repr").lower()
+
+
+def _is_empty(value) -> bool:
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def compact_item(item: Dict) -> Dict:
+    """Drop None/blank fields from an extracted item"""
+    return {k: v for k, v in item.items() if not _is_empty(v)}
+
+
+def format_items(items: List[Dict], mode: str = None) -> str:
+    """Render extracted items for the prompt.
+
+    compact: ``- name: X | address: Y | link: Z`` per line, empty fields skipped.
+    """
+    mode = (mode or PROMPT_ITEM_FORMAT).lower()
+    if mode != "compact":
+        return str(items)
+    lines = []
+    for item in items:
+        fields = compact_item(item)
+        if fields:
+            lines.append("- " + " | ".join(f"{k}: {v}" for k, v in fields.items()))
+    return "\n" + "\n".join(lines) if lines else "(none)"
@@ -0,0 +1,207 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional
+
+from app_logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit is open"""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with half-open probing.
+
+    A call counts as a failure if it raises or takes longer than
+    ``slow_call_s``. After ``failure_threshold`` consecutive failures the
+    circuit opens for ``open_duration`` seconds; then up to
+    ``half_open_max_calls`` probes are let through. A successful probe closes
+    the circuit, a failed one re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, slow_call_s: float = 2.0,
+                 open_duration: float = 30.0, half_open_max_calls: int = 1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call_s = slow_call_s
+        self.open_duration = open_duration
+        self.half_open_max_calls = half_open_max_calls
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        # Pipelines of concurrent requests run on separate threads
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a call may go to the dependency right now"""
+        with self._lock:
+            return self._allow()
+
+    def _allow(self) -> bool:
+        if self.state == self.OPEN:
+            if time.monotonic() - self._opened_at < self.open_duration:
+                return False
+            self.state = self.HALF_OPEN
+            self._probes_in_flight = 0
+            logger.info("Circuit %s half-open, probing", self.name)
+        if self.state == self.HALF_OPEN:
+            if self._probes_in_flight >= self.half_open_max_calls:
+                return False
+            self._probes_in_flight += 1
+        return True
+
+    def record(self, duration: float, ok: bool) -> None:
+        with self._lock:
+            self._record(duration, ok)
+
+    def _record(self, duration: float, ok: bool) -> None:
+        if ok and duration <= self.slow_call_s:
+            if self.state != self.CLOSED:
+                logger.info("Circuit %s closed", self.name)
+            self.state = self.CLOSED
+            self._failures = 0
+            return
+        self._failures += 1
+        if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning("Circuit %s open after %d failed/slow calls", self.name, self._failures)
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+
+    def abandon(self, duration: float) -> None:
+        """A call was cancelled after ``duration`` seconds (e.g. by a request
+        deadline).
+
+        If it already ran for ``slow_call_s`` or longer it counts as a slow
+        call, so an upstream slower than the callers' budgets still opens
+        the circuit. Otherwise its outcome is unknown: neutral while closed,
+        while an abandoned half-open probe re-opens the circuit, which also
+        frees the probe slot for the next half-open period.
+        """
+        with self._lock:
+            if duration >= self.slow_call_s:
+                self._record(duration, ok=False)
+            elif self.state == self.HALF_OPEN:
+                logger.warning("Circuit %s probe abandoned, re-opening", self.name)
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probes_in_flight = 0
+
+    def stats(self) -> dict:
+        return {"state": self.state, "consecutive_failures": self._failures}
+
+
+class LatencyWindow:
+    """Recent call latencies, for percentile-based hedging delays"""
+
+    def __init__(self, size: int = 200):
+        self._samples = deque(maxlen=size)
+
+    def add(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+async def hedged(call: Callable[[], Awaitable], delay: Optional[float]):
+    """Run ``call``; if it has not finished after ``delay`` seconds start a
+    second attempt and return whichever succeeds first.
+
+    ``delay=None`` disables hedging. If both attempts fail the first error is
+    raised.
+    """
+    first = asyncio.ensure_future(call())
+    if delay is None:
+        return await first
+    done, _ = await asyncio.wait({first}, timeout=delay)
+    if done:
+        return first.result()
+
+    second = asyncio.ensure_future(call())
+    pending = {first, second}
+    error = None
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception() is None:
+                for other in pending:
+                    other.cancel()
+                return task.result()
+            if error is None or task is first:
+                error = task.exception()
+    raise error
+
+
+class ResilientCall:
+    """Circuit breaker plus optional hedging around one async dependency"""
+
+    def __init__(self, breaker: CircuitBreaker, hedge: bool = False,
+                 hedge_quantile: float = 0.95, hedge_min_samples: int = 20, hedge_min_delay: float = 0.05):
+        self.breaker = breaker
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+        self.latencies = LatencyWindow()
+        self.hedges_sent = 0
+
+    def hedge_delay(self) -> Optional[float]:
+        if not self.hedge or len(self.latencies) < self.hedge_min_samples:
+            return None
+        return max(self.hedge_min_delay, self.latencies.percentile(self.hedge_quantile))
+
+    async def __call__(self, call: Callable[[], Awaitable], is_failure: Callable[[BaseException], bool] = None):
+        """Run ``call`` through the breaker.
+
+        ``is_failure`` decides whether an exception counts against the
+        circuit (e.g. a 404 for an unknown city should not).
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(self.breaker.name)
+        delay = self.hedge_delay()
+        start = time.monotonic()
+        try:
+            if delay is not None:
+                result = await hedged(self._count_hedge(call, start, delay), delay)
+            else:
+                result = await call()
+        except Exception as e:
+            failed = is_failure(e) if is_failure else True
+            self.breaker.record(time.monotonic() - start, ok=not failed)
+            raise
+        except BaseException:
+            # Cancelled (e.g. by a request deadline): report back anyway so a
+            # half-open probe cannot stay in flight forever
+            self.breaker.abandon(time.monotonic() - start)
+            raise
+        duration = time.monotonic() - start
+        self.latencies.add(duration)
+        self.breaker.record(duration, ok=True)
+        return result
+
+    def _count_hedge(self, call, start, delay):
+        async def attempt():
+            if time.monotonic() - start >= delay:
+                self.hedges_sent += 1
+            return await call()
+        return attempt
+
+    def stats(self) -> dict:
+        p95 = self.latencies.percentile(0.95)
+        return dict(self.breaker.stats(), p95_s=p95, hedges_sent=self.hedges_sent)
@@ -0,0 +1,188 @@
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from app_logging import get_logger
+
+logger = get_logger(__name__)
+
+# Returned by TieredCache.get on a miss (None is a cacheable value)
+MISS = object()
+
+
+def _contended(error: sqlite3.Error) -> bool:
+    """Another connection holds the database lock (SQLITE_BUSY/SQLITE_LOCKED)"""
+    code = getattr(error, "sqlite_errorcode", None)
+    if code is not None:
+        return code & 0xFF in (5, 6)
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+
+class SharedCache:
+    """Host-wide cache tier shared by all worker processes.
+
+    Backed by a sqlite database in WAL mode (no external service). Entries
+    carry a TTL; when the table grows past ``max_entries`` the entries closest
+    to expiry are evicted. Lock contention with another worker costs one miss
+    (or one skipped write); any other sqlite error disables the tier for
+    ``retry_after`` seconds and callers simply see misses.
+    """
+
+    def __init__(self, path: str, max_entries: int = 100000, retry_after: float = 30.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.retry_after = retry_after
+        self._local = threading.local()
+        self._disabled_until = 0.0
+        self._writes = 0
+        self.contended = 0
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=0.05, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires_at)")
+            self._local.conn = conn
+        return conn
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self._disabled_until
+
+    def _fail(self, op: str, error: Exception) -> None:
+        if isinstance(error, sqlite3.Error) and _contended(error):
+            # Busy for longer than the busy timeout: skip this one operation
+            self.contended += 1
+            logger.debug("Shared cache %s skipped, database busy", op)
+            return
+        if self.available:
+            logger.warning("Shared cache %s failed (%s); bypassing for %.0fs", op, error, self.retry_after)
+        self._disabled_until = time.monotonic() + self.retry_after
+        self._local.conn = None
+
+    def get(self, key: str, default=None) -> Any:
+        """Stored value, or ``default`` on a miss, an undecodable row or any
+        sqlite error.
+
+        Blocking (sqlite I/O with a short busy timeout): call it from worker
+        threads, not the event loop.
+        """
+        if not self.available:
+            return default
+        try:
+            row = self._conn().execute(
+                "SELECT value FROM cache WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+            return json.loads(row[0]) if row else default
+        except sqlite3.Error as e:
+            self._fail("read", e)
+            return default
+        except (TypeError, ValueError):
+            logger.warning("Undecodable shared cache entry %s, treating as a miss", key)
+            return default
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        if not self.available:
+            return
+        try:
+            conn = self._conn()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), time.time() + ttl),
+            )
+            self._writes += 1
+            # Amortize eviction over writes
+            if self._writes % 256 == 0 or random.random() < 0.001:
+                self._evict(conn)
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            self._fail("write", e)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+        (count,) = conn.execute("SELECT COUNT(*) FROM cache").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            conn.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY expires_at LIMIT ?)",
+                (excess,),
+            )
+
+
+def shared_cache_from_env() -> Optional[SharedCache]:
+    """SHARED_CACHE_ENABLED/PATH/MAX_ENTRIES; None when disabled"""
+    if os.getenv("SHARED_CACHE_ENABLED", "1") != "1":
+        return None
+    path = os.getenv("SHARED_CACHE_PATH", os.path.join(tempfile.gettempdir(), "travel_api_shared_cache.sqlite3"))
+    return SharedCache(path, max_entries=int(os.getenv("SHARED_CACHE_MAX_ENTRIES", "100000")))
+
+
+shared_cache = shared_cache_from_env()
+
+
+class TieredCache:
+    """Per-process LRU in front of the shared tier (read- and write-through)"""
+
+    def __init__(self, namespace: str, ttl: float, max_local: int = 2048,
+                 shared: Optional[SharedCache] = shared_cache):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_local = max_local
+        self.shared = shared
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def _shared_key(self, key: str) -> str:
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return f"{self.namespace}:{digest}"
+
+    def _put_local(self, key: str, value: Any, expires_at: float) -> None:
+        with self._lock:
+            self._local[key] = (value, expires_at)
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_local:
+                self._local.popitem(last=False)
+
+    def get(self, key: str, default=MISS) -> Any:
+        """Cached value, or ``default`` (MISS if omitted) on a miss"""
+        now = time.time()
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None and entry[1] > now:
+                self._local.move_to_end(key)
+                self.local_hits += 1
+                return entry[0]
+        if self.shared is not None:
+            wrapped = self.shared.get(self._shared_key(key))
+            if isinstance(wrapped, dict) and "v" in wrapped and "exp" in wrapped:
+                self.shared_hits += 1
+                self._put_local(key, wrapped["v"], wrapped["exp"])
+                return wrapped["v"]
+        self.misses += 1
+        return default
+
+    def set(self, key: str, value: Any) -> None:
+        expires_at = time.time() + self.ttl
+        self._put_local(key, value, expires_at)
+        if self.shared is not None:
+            self.shared.set(self._shared_key(key), {"v": value, "exp": expires_at}, self.ttl)
+
+    def stats(self) -> dict:
+        return {"local_entries": len(self._local), "local_hits": self.local_hits,
+                "shared_hits": self.shared_hits, "misses": self.misses}
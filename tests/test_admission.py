@@ -0,0 +1,105 @@
+import asyncio
+import time
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected
+
+
+def cpu_work(seconds):
+    """Busy loop holding the CPU (and the GIL) like RAKE/NER/ranking do"""
+    end = time.perf_counter() + seconds
+    n = 0
+    while time.perf_counter() < end:
+        n += 1
+    return n
+
+
+async def timed_request(controller, work):
+    start = time.perf_counter()
+    try:
+        await controller.run(cpu_work, work)
+        return "ok", time.perf_counter() - start
+    except AdmissionRejected as e:
+        return e.reason, time.perf_counter() - start
+
+
+def test_sheds_under_cpu_bound_load():
+    controller = AdmissionController(max_concurrency=2, max_queue=2, max_wait=0.3)
+
+    async def scenario():
+        return await asyncio.gather(*(timed_request(controller, 0.5) for _ in range(6)))
+
+    try:
+        results = asyncio.run(scenario())
+    finally:
+        controller.close()
+
+    outcomes = sorted(r for r, _ in results)
+    assert outcomes == ["ok", "ok", "queue full", "queue full", "queue wait timeout", "queue wait timeout"]
+    # Rejections are fast: queue-full immediately, timeouts after ~max_wait,
+    # not after the admitted requests' work
+    for reason, elapsed in results:
+        if reason == "queue full":
+            assert elapsed < 0.2
+        elif reason == "queue wait timeout":
+            assert elapsed < 0.45
+    stats = controller.stats()
+    assert stats["admitted"] == 2
+    assert stats["in_flight"] == 0 and stats["queue_depth"] == 0
+
+
+def test_runs_coroutines_on_worker_loop():
+    controller = AdmissionController(max_concurrency=1, max_queue=0, max_wait=1)
+
+    async def pipeline(x):
+        await asyncio.sleep(0)
+        return x * 2
+
+    async def scenario():
+        main_loop = asyncio.get_running_loop()
+
+        async def which_loop():
+            return asyncio.get_running_loop()
+
+        assert await controller.run(pipeline, 21) == 42
+        assert await controller.run(which_loop) is not main_loop
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        controller.close()
+
+
+def test_cancelled_caller_keeps_slot_until_worker_finishes():
+    controller = AdmissionController(max_concurrency=1, max_queue=0, max_wait=1)
+
+    async def scenario():
+        task = asyncio.create_task(controller.run(cpu_work, 0.3))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # Worker thread is still busy, so the single slot is still taken
+        with pytest.raises(AdmissionRejected):
+            await controller.run(cpu_work, 0)
+        await asyncio.sleep(0.4)
+        assert await controller.run(cpu_work, 0) >= 0
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        controller.close()
+
+
+def test_refused_work_releases_its_slot():
+    admission = AdmissionController(max_concurrency=1, max_queue=0, max_wait=0.1)
+    admission.close()
+
+    async def scenario():
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                await admission.run(sum, [1, 2])
+        assert admission.stats()["in_flight"] == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,91 @@
+import importlib
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+pytest.importorskip("dotenv")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import location_ner  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="module")
+def client(tmp_path_factory):
+    journal = tmp_path_factory.mktemp("api") / "journal.jsonl"
+
+    async def keywords(text):
+        return text.lower().split()
+
+    async def weather(location, api_key):
+        return f"Sunny in {location}"
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.chdir(ROOT)
+        mp.setenv("CATALOG_JOURNAL", str(journal))
+        mp.setenv("FILTER_CACHE_WARM", "0")
+        mp.setenv("ADMISSION_MAX_CONCURRENCY", "4")
+        main = importlib.import_module("main")
+        # No NLTK downloads or weather calls; only the gazetteer decides the location
+        mp.setattr(main, "get_user_keywords", keywords)
+        mp.setattr(main, "get_weather", weather)
+        mp.setattr(location_ner, "_gazetteer", lambda: ({"rome"}, {"italy"}, set()))
+        # One lifespan per module, like one per process: shutdown closes the pools
+        with TestClient(main.app) as client:
+            yield client
+
+
+def ask(client, text, deadline_ms="1000"):
+    # Below DEADLINE_NER_MIN_MS: NER is skipped for the fast path
+    return client.post("/test_api_2/?format=structured", json={"user_input": text},
+                       headers={"X-Request-Deadline-Ms": deadline_ms})
+
+
+def test_degraded_query_about_non_catalog_city(client):
+    response = ask(client, "Family hotels near the Colosseum in Rome")
+    assert response.status_code == 200
+    body = response.json()
+    assert "location_fast_path" in body["degradations"]
+    assert "Welcome to Rome" in body["response"]["prompt"]
+    assert "Sunny in rome" in body["response"]["prompt"]
+    assert body["response"]["items"]["hotels"] == []
+
+
+def test_degraded_query_without_a_place(client):
+    response = ask(client, "somewhere warm for a family trip")
+    assert response.status_code == 200
+    body = response.json()
+    assert "Welcome to your destination" in body["response"]["prompt"]
+    assert all(items == [] for items in body["response"]["items"].values())
+
+
+def test_degraded_query_about_catalog_city(client):
+    response = ask(client, "family hotels in paris")
+    assert response.status_code == 200
+    assert len(response.json()["response"]["items"]["hotels"]) == 3
+
+
+def test_ner_runs_for_every_admitted_request(client, monkeypatch):
+    import main
+
+    # Every admitted request must be inside NER at the same time to pass
+    barrier = threading.Barrier(main.admission.max_concurrency, timeout=3)
+
+    def ner(text):
+        barrier.wait()
+        return "Paris"
+
+    monkeypatch.setattr(main, "LOCATION_NER_ENGINE", "spacy")
+    monkeypatch.setattr(main, "extract_location", ner)
+    texts = [f"family hotels {uuid.uuid4().hex}" for _ in range(main.admission.max_concurrency)]
+    with ThreadPoolExecutor(len(texts)) as pool:
+        responses = list(pool.map(lambda text: ask(client, text, deadline_ms="5000"), texts))
+    assert [r.status_code for r in responses] == [200] * len(texts)
+    assert all(r.json()["degradations"] == [] for r in responses)
@@ -0,0 +1,42 @@
+import json
+import logging
+import queue
+
+from app_logging import RequestIdFilter, StructuredFormatter, StructuredQueueHandler, request_id_var
+
+
+def queued_line(log):
+    records = queue.SimpleQueue()
+    handler = StructuredQueueHandler(records)
+    handler.addFilter(RequestIdFilter())
+    logger = logging.getLogger("test_app_logging")
+    logger.propagate = False
+    logger.handlers[:] = [handler]
+    logger.setLevel(logging.DEBUG)
+    token = request_id_var.set("req-1")
+    try:
+        log(logger)
+    finally:
+        request_id_var.reset(token)
+        logger.handlers[:] = []
+    return json.loads(StructuredFormatter().format(records.get_nowait()))
+
+
+def test_exception_is_a_structured_field():
+    def log(logger):
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logger.exception("Failed for %s", "paris", extra={"data": {"stage": "weather"}})
+
+    line = queued_line(log)
+    assert line["msg"] == "Failed for paris"
+    assert "Traceback" in line["exc"] and "ValueError: boom" in line["exc"]
+    assert line["stage"] == "weather"
+    assert line["request_id"] == "req-1"
+
+
+def test_plain_record_has_no_exc():
+    line = queued_line(lambda logger: logger.info("hello %d", 3))
+    assert line["msg"] == "hello 3"
+    assert "exc" not in line
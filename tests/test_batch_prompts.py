@@ -0,0 +1,28 @@
+from batch_prompts import _completed_lines, _read_records, _run_one
+
+
+def test_completed_lines_drops_torn_tail(tmp_path):
+    path = tmp_path / "out.jsonl"
+    path.write_bytes(b'{"index": 0}\n{"index": 1}\n{"ind')
+    assert _completed_lines(str(path), chunk_size=4) == 2
+    assert path.read_bytes() == b'{"index": 0}\n{"index": 1}\n'
+
+
+def test_completed_lines_edge_cases(tmp_path):
+    assert _completed_lines(str(tmp_path / "missing.jsonl")) == 0
+    path = tmp_path / "out.jsonl"
+    path.write_bytes(b"no newline yet")
+    assert _completed_lines(str(path), chunk_size=3) == 0
+    assert path.read_bytes() == b""
+    path.write_bytes(b"a\n" * 1000)
+    assert _completed_lines(str(path), chunk_size=7) == 1000
+
+
+def test_non_object_lines_become_error_results(tmp_path):
+    path = tmp_path / "queries.jsonl"
+    path.write_text('"text"\n[1, 2]\n{not json\n42\n{"user_input": "hotels in paris", "request_id": "r1"}\n',
+                    encoding="utf-8")
+    records = list(_read_records(str(path)))
+    assert records[:4] == [{}, {}, {}, {}]
+    assert records[4]["request_id"] == "r1"
+    assert _run_one(0, records[0], None) == {"index": 0, "error": "no query text"}
@@ -0,0 +1,120 @@
+import json
+
+import pytest
+
+from catalog_store import CatalogStore
+
+
+def item(ref, **fields):
+    return dict({"product_ref": ref, "title": f"Item {ref}"}, **fields)
+
+
+@pytest.fixture
+def paths(tmp_path):
+    snapshot = tmp_path / "catalog.json"
+    snapshot.write_text(json.dumps({
+        "Shopping": {"paris_shopping": [item("A"), item("B"), item("A", title="duplicate"), item("C")]},
+        "Hotels": {"paris_hotels": [item("H1"), {"title": "no ref"}, item("H2")]},
+    }), encoding="utf-8")
+    return str(snapshot), str(tmp_path / "journal.jsonl")
+
+
+def refs(store, data_type, bucket):
+    return [i.get("product_ref") for i in store.data[data_type][bucket]]
+
+
+def test_duplicate_refs_are_dropped_at_load(paths):
+    store = CatalogStore(*paths)
+    assert refs(store, "Shopping", "paris_shopping") == ["A", "B", "C"]
+    assert store.get_item("Shopping", "paris", "A")["title"] == "Item A"
+    assert store.delete("Shopping", "paris", "A")
+    assert not store.delete("Shopping", "paris", "A")
+    assert refs(store, "Shopping", "paris_shopping") == ["B", "C"]
+
+
+def test_upsert_inserts_and_replaces(paths):
+    store = CatalogStore(*paths)
+    assert store.upsert("Shopping", "Paris", item("D"))
+    assert not store.upsert("Shopping", "paris", item("B", title="new B"))
+    assert refs(store, "Shopping", "paris_shopping") == ["A", "B", "C", "D"]
+    assert store.get_item("Shopping", "paris", "B")["title"] == "new B"
+    assert store.upsert("Activities", "rome", item("R1"))
+    assert store.get_items_by_refs("Activities", "rome", ["R1", "missing"]) == [item("R1")]
+    with pytest.raises(ValueError):
+        store.upsert("Shopping", "paris", {"title": "no ref"})
+
+
+def test_delete_skips_items_without_ref(paths):
+    store = CatalogStore(*paths)
+    assert store.delete("Hotels", "paris", "H1")
+    assert refs(store, "Hotels", "paris_hotels") == [None, "H2"]
+    assert store.get_item("Hotels", "paris", "H2")["product_ref"] == "H2"
+    assert store.journal_entries == 1
+
+
+def test_writes_are_copy_on_write(paths):
+    store = CatalogStore(*paths)
+    before = store.data
+    bucket = before["Shopping"]["paris_shopping"]
+    store.upsert("Shopping", "paris", item("D"))
+    store.delete("Shopping", "paris", "B")
+    store.set_value("paris_weather_latest", "sunny")
+    assert [i["product_ref"] for i in bucket] == ["A", "B", "C"]
+    assert "paris_weather_latest" not in before
+    assert refs(store, "Shopping", "paris_shopping") == ["A", "C", "D"]
+
+
+def test_other_process_replays_journal(paths):
+    writer, reader = CatalogStore(*paths), CatalogStore(*paths)
+    reader.ensure_loaded()
+    writer.upsert("Shopping", "paris", item("D"))
+    writer.delete("Shopping", "paris", "A")
+    writer.set_value("paris_weather_latest", "sunny")
+    reader.refresh()
+    assert refs(reader, "Shopping", "paris_shopping") == ["B", "C", "D"]
+    assert reader.get_value("paris_weather_latest") == "sunny"
+    assert reader.version == writer.version
+
+
+def test_torn_and_unreadable_journal_lines(paths):
+    snapshot, journal = paths
+    with open(journal, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"op": "upsert", "type": "Shopping", "location": "paris", "item": item("D")}) + "\n")
+        f.write(json.dumps({"op": "bogus"}) + "\n")
+        f.write('{"op": "delete", "type": "Shop')  # writer still appending
+    store = CatalogStore(snapshot, journal)
+    assert refs(store, "Shopping", "paris_shopping") == ["A", "B", "C", "D"]
+    assert store.journal_entries == 1
+    with open(journal, "a", encoding="utf-8") as f:
+        f.write('ping", "location": "paris", "product_ref": "A"}\n')
+    store.refresh()
+    assert refs(store, "Shopping", "paris_shopping") == ["B", "C", "D"]
+
+
+def test_compaction_folds_journal_into_snapshot(paths):
+    snapshot, journal = paths
+    store = CatalogStore(snapshot, journal)
+    other = CatalogStore(snapshot, journal)
+    other.ensure_loaded()
+    store.upsert("Shopping", "paris", item("D"))
+    store.delete("Hotels", "paris", "H1")
+    store.compact()
+    assert store.journal_entries == 0
+    with open(journal, encoding="utf-8") as f:
+        assert f.read() == ""
+    fresh = CatalogStore(snapshot, journal)
+    assert refs(fresh, "Shopping", "paris_shopping") == ["A", "B", "C", "D"]
+    assert refs(fresh, "Hotels", "paris_hotels") == [None, "H2"]
+    # A worker that loaded before the compaction reloads from the new snapshot
+    other.refresh()
+    assert refs(other, "Shopping", "paris_shopping") == ["A", "B", "C", "D"]
+
+
+def test_snapshot_pairs_data_with_its_version(paths):
+    store = CatalogStore(*paths)
+    data, version = store.snapshot()
+    store.upsert("Shopping", "paris", item("D"))
+    new_data, new_version = store.snapshot()
+    assert new_version != version
+    assert "D" not in [i["product_ref"] for i in data["Shopping"]["paris_shopping"]]
+    assert new_data["Shopping"]["paris_shopping"][-1]["product_ref"] == "D"
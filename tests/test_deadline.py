@@ -0,0 +1,48 @@
+import threading
+import time
+
+import pytest
+
+import deadline
+from deadline import BoundedExecutor, deadline_from_headers
+
+
+@pytest.mark.parametrize("raw", ["0", "-5", "nan", "inf", "-inf", "soon", ""])
+def test_invalid_header_falls_back_to_server_slo(raw):
+    d = deadline_from_headers({deadline.DEADLINE_HEADER: raw})
+    assert d is not None
+    assert d.budget_s == pytest.approx(deadline.REQUEST_SLO_MS / 1000.0)
+
+
+def test_header_is_clamped_to_max():
+    d = deadline_from_headers({deadline.DEADLINE_HEADER: "1e12"})
+    assert d.budget_s == pytest.approx(deadline.REQUEST_SLO_MAX_MS / 1000.0)
+    assert deadline_from_headers({deadline.DEADLINE_HEADER: "250"}).budget_s == pytest.approx(0.25)
+
+
+def test_server_slo_zero_disables(monkeypatch):
+    monkeypatch.setattr(deadline, "REQUEST_SLO_MS", 0)
+    assert deadline_from_headers({deadline.DEADLINE_HEADER: "1000"}) is None
+
+
+def test_bounded_executor_refuses_when_saturated():
+    executor = BoundedExecutor(1, "test")
+    release = threading.Event()
+    try:
+        busy = executor.try_submit(release.wait, 5)
+        assert busy is not None
+        # The slow call was abandoned by its caller but still holds the worker
+        assert executor.try_submit(time.sleep, 0) is None
+        release.set()
+        busy.result(timeout=5)
+        # The slot is freed by the future's done callback, right after result()
+        for _ in range(100):
+            future = executor.try_submit(lambda: 42)
+            if future is not None:
+                break
+            time.sleep(0.01)
+        assert future.result(timeout=5) == 42
+        assert executor.rejected >= 1
+    finally:
+        release.set()
+        executor.close()
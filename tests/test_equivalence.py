@@ -0,0 +1,34 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("dotenv")
+
+import equivalence_harness as harness  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def golden():
+    return harness.load_golden(harness.GOLDEN_PATH)
+
+
+@pytest.mark.parametrize("candidate", ["reference", "cached"])
+def test_retrieval_matches_baseline_golden(golden, candidate):
+    catalog, cases = golden
+    code = asyncio.run(harness.run(harness.golden_engine(cases), harness.load_engine(candidate),
+                                   catalog, cases, tolerate="none", show=5))
+    assert code == 0
+
+
+def test_fast_location_engine_resolves_generated_text(golden):
+    catalog, cases = golden
+    code = asyncio.run(harness.run(harness.golden_engine(cases), harness.load_engine("cached"), catalog, cases,
+                                   tolerate="none", show=5, candidate_location=harness.fast_location_engine))
+    assert code == 0
+
+
+def test_detects_location_regression(golden):
+    catalog, cases = golden
+    code = asyncio.run(harness.run(harness.golden_engine(cases), harness.load_engine("cached"), catalog, cases,
+                                   tolerate="none", show=0, candidate_location=lambda text: "rome"))
+    assert code == 1
@@ -0,0 +1,57 @@
+import pytest
+
+pytest.importorskip("dotenv")
+
+from user_keywords_ext import FilterCache  # noqa: E402
+
+INTENT = (None, None, (), ())
+
+
+def item(ref, title=None):
+    return {"product_ref": ref, "title": title or f"Item {ref}"}
+
+
+def test_hit_resolves_refs_against_the_callers_items():
+    cache = FilterCache()
+    old = [item("A"), item("B")]
+    assert cache.get_or_compute("v1", "paris", "Shopping", INTENT, old) == old
+    assert cache.get_or_compute("v1", "paris", "Shopping", INTENT, old) == old
+    assert cache.hits == 1
+
+    # Same version, other items (e.g. a write landed between reading data and version)
+    new = [item("A", "new A"), item("B")]
+    assert cache.get_or_compute("v1", "paris", "Shopping", INTENT, new)[0]["title"] == "new A"
+
+
+def test_entry_built_from_stale_items_is_recomputed():
+    cache = FilterCache()
+    stale = [item("A"), item("B")]
+    cache.get_or_compute("v2", "paris", "Shopping", INTENT, stale)
+    current = [item("C"), item("D")]
+    assert cache.get_or_compute("v2", "paris", "Shopping", INTENT, current) == current
+    assert cache.get_or_compute("v2", "paris", "Shopping", INTENT, current) == current
+
+
+def test_warmer_rewarms_after_catalog_changes(tmp_path):
+    import json
+
+    from catalog_store import CatalogStore
+    from user_keywords_ext import FilterCacheWarmer, filter_cache
+
+    snapshot = tmp_path / "catalog.json"
+    snapshot.write_text(json.dumps({"Shopping": {"paris_shopping": [item("A"), item("B")]}}), encoding="utf-8")
+    store = CatalogStore(str(snapshot), str(tmp_path / "journal.jsonl"))
+    warmer = FilterCacheWarmer(store.snapshot)
+
+    def warm_hit():
+        data, version = store.snapshot()
+        hits = filter_cache.hits
+        filter_cache.get_or_compute(version, "paris", "Shopping", INTENT, data["Shopping"]["paris_shopping"])
+        return filter_cache.hits == hits + 1
+
+    warmer.warm()
+    assert warm_hit() and not warmer.stale(store.version)
+    store.upsert("Shopping", "paris", item("C"))
+    assert warmer.stale(store.version)
+    warmer.warm()
+    assert warm_hit()
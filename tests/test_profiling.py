@@ -0,0 +1,77 @@
+import asyncio
+import os
+import pstats
+
+from admission import AdmissionController
+from app_logging import request_id_var, safe_request_id
+from deadline import BoundedExecutor
+from profiling import ProfilingMiddleware
+
+
+async def ok_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def test_safe_request_id():
+    assert safe_request_id("abc-DEF_123") == "abc-DEF_123"
+    assert safe_request_id("../../../x") == "x"
+    assert len(safe_request_id("a" * 500)) == 64
+    assert len(safe_request_id("../..")) == 32  # fresh uuid4 hex
+    assert len(safe_request_id(None)) == 32
+
+
+def test_profile_files_stay_in_profile_dir(tmp_path, monkeypatch):
+    profiles = tmp_path / "profiles"
+    monkeypatch.chdir(tmp_path)
+    middleware = ProfilingMiddleware(ok_app, directory=str(profiles), sample_rate=1.0, keep=5)
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    async def scenario():
+        token = request_id_var.set("../../../escaped")
+        try:
+            await middleware({"type": "http", "headers": []}, None, send)
+        finally:
+            request_id_var.reset(token)
+
+    asyncio.run(scenario())
+    written = os.listdir(profiles)
+    assert any(name.endswith("_escaped.prof") for name in written)
+    assert not list(tmp_path.glob("escaped*"))
+    profile_id = dict(sent[0]["headers"])[b"x-profile-id"].decode()
+    assert "/" not in profile_id and ".." not in profile_id
+
+
+def ner_stage(text):
+    return sum(len(word) for word in text.split() * 200)
+
+
+async def pipeline_stage(executor, text):
+    found = await asyncio.wrap_future(executor.try_submit(ner_stage, text))
+    return sorted(range(found))
+
+
+def test_profile_includes_worker_threads(tmp_path):
+    admission = AdmissionController(max_concurrency=2, max_queue=0, max_wait=1)
+    ner_executor = BoundedExecutor(1, "ner")
+
+    async def app(scope, receive, send):
+        await admission.run(pipeline_stage, ner_executor, "hotels near the eiffel tower")
+        await ok_app(scope, receive, send)
+
+    middleware = ProfilingMiddleware(app, directory=str(tmp_path), sample_rate=1.0, keep=5)
+
+    async def send(message):
+        pass
+
+    try:
+        asyncio.run(middleware({"type": "http", "headers": []}, None, send))
+    finally:
+        admission.close()
+        ner_executor.close()
+    [path] = tmp_path.glob("*.prof")
+    functions = {name for _, _, name in pstats.Stats(str(path)).stats}
+    assert {"pipeline_stage", "ner_stage", "ok_app"} <= functions
@@ -0,0 +1,152 @@
+import asyncio
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from fake_weather_server import start_in_thread
+from resilience import CircuitBreaker, CircuitOpenError, ResilientCall
+
+
+@pytest.fixture
+def server():
+    server = start_in_thread()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def fetch(server, city="Paris"):
+    """Blocking GET against the fake upstream; 5xx raise"""
+    with urllib.request.urlopen(f"{server.url}?q={city}", timeout=5) as response:
+        return json.loads(response.read())
+
+
+def make_call(failure_threshold=3, slow_call_s=0.5, open_duration=0.2):
+    breaker = CircuitBreaker("test", failure_threshold=failure_threshold, slow_call_s=slow_call_s,
+                             open_duration=open_duration)
+    return ResilientCall(breaker)
+
+
+async def call(upstream, server):
+    return await upstream(lambda: asyncio.to_thread(fetch, server))
+
+
+async def trip(upstream, server):
+    server.error_rate = 1.0
+    for _ in range(upstream.breaker.failure_threshold):
+        with pytest.raises(urllib.error.HTTPError):
+            await call(upstream, server)
+
+
+def test_opens_after_consecutive_failures_and_fails_fast(server):
+    upstream = make_call()
+
+    async def scenario():
+        await trip(upstream, server)
+        assert upstream.breaker.state == CircuitBreaker.OPEN
+        server.error_rate = 0.0
+        with pytest.raises(CircuitOpenError):
+            await call(upstream, server)
+
+    asyncio.run(scenario())
+
+
+def test_slow_calls_open_the_circuit(server):
+    upstream = make_call(failure_threshold=2, slow_call_s=0.05)
+    server.latency = 0.1
+
+    async def scenario():
+        for _ in range(2):
+            await call(upstream, server)
+        assert upstream.breaker.state == CircuitBreaker.OPEN
+
+    asyncio.run(scenario())
+
+
+def test_half_open_probe_recovers_when_upstream_is_healthy(server):
+    upstream = make_call()
+
+    async def scenario():
+        await trip(upstream, server)
+        server.error_rate = 0.0
+        await asyncio.sleep(0.25)
+        assert (await call(upstream, server))["name"] == "Paris"
+        assert upstream.breaker.state == CircuitBreaker.CLOSED
+
+    asyncio.run(scenario())
+
+
+def test_failed_half_open_probe_reopens(server):
+    upstream = make_call()
+
+    async def scenario():
+        await trip(upstream, server)
+        await asyncio.sleep(0.25)
+        with pytest.raises(urllib.error.HTTPError):
+            await call(upstream, server)
+        assert upstream.breaker.state == CircuitBreaker.OPEN
+        with pytest.raises(CircuitOpenError):
+            await call(upstream, server)
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_half_open_probe_does_not_wedge_the_circuit(server):
+    upstream = make_call(slow_call_s=5)
+
+    async def scenario():
+        await trip(upstream, server)
+        server.error_rate = 0.0
+        server.latency = 0.5
+        await asyncio.sleep(0.25)
+        # A request deadline cancels the probe mid-flight
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(call(upstream, server), timeout=0.1)
+        assert upstream.breaker.state == CircuitBreaker.OPEN
+
+        # Upstream recovers; the next half-open period lets a probe through again
+        server.latency = 0.0
+        await asyncio.sleep(0.25)
+        assert (await call(upstream, server))["name"] == "Paris"
+        assert upstream.breaker.state == CircuitBreaker.CLOSED
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_call_while_closed_counts_only_when_slow(server):
+    server.latency = 0.5
+
+    async def scenario():
+        # Cancelled before it could be called slow: outcome unknown, neutral
+        upstream = make_call(failure_threshold=1, slow_call_s=5)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(call(upstream, server), timeout=0.05)
+        assert upstream.breaker.state == CircuitBreaker.CLOSED
+
+        # Cancelled after slow_call_s: an upstream slower than every request
+        # budget must still open the circuit
+        upstream = make_call(failure_threshold=2, slow_call_s=0.1, open_duration=30)
+        for _ in range(2):
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(call(upstream, server), timeout=0.2)
+        assert upstream.breaker.state == CircuitBreaker.OPEN
+        with pytest.raises(CircuitOpenError):
+            await call(upstream, server)
+
+    asyncio.run(scenario())
+
+
+def test_weather_fetch_against_fake_server(server, monkeypatch):
+    pytest.importorskip("requests")
+    import weather
+
+    monkeypatch.setattr(weather, "WEATHER_API_URL", server.url)
+    server.unknown = {"atlantis"}
+    assert "current weather in Paris" in weather.fetch_weather_text_sync("paris", "key")
+    with pytest.raises(weather.WeatherNotFound):
+        weather.fetch_weather_text_sync("atlantis", "key")
+    server.error_rate = 1.0
+    with pytest.raises(weather.WeatherUpstreamError):
+        weather.fetch_weather_text_sync("paris", "key")
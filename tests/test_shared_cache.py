@@ -0,0 +1,70 @@
+import sqlite3
+
+from shared_cache import MISS, SharedCache, TieredCache
+
+
+def test_round_trip_and_expiry(tmp_path):
+    cache = SharedCache(str(tmp_path / "cache.sqlite3"))
+    cache.set("k", {"a": 1}, ttl=60)
+    assert cache.get("k") == {"a": 1}
+    cache.set("old", 1, ttl=-1)
+    assert cache.get("old", "missing") == "missing"
+
+
+def test_undecodable_row_is_a_miss(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = SharedCache(path)
+    cache.set("k", "ok", ttl=60)
+    conn = sqlite3.connect(path)
+    conn.execute("UPDATE cache SET value = ? WHERE key = ?", ("{not json", "k"))
+    conn.commit()
+    conn.close()
+    assert cache.get("k", "default") == "default"
+    # A bad row does not disable the tier
+    assert cache.available
+
+
+def test_lock_contention_costs_one_operation_not_the_tier(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = SharedCache(path)
+    cache.set("k", "before", ttl=60)
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")  # another worker mid-write
+    try:
+        cache.set("k", "during", ttl=60)
+        assert cache.contended == 1
+        assert cache.available
+        assert cache.get("k") == "before"  # WAL readers are not blocked
+    finally:
+        other.execute("ROLLBACK")
+        other.close()
+    cache.set("k", "after", ttl=60)
+    assert cache.get("k") == "after"
+
+
+def test_corrupt_database_disables_the_tier(tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    path.write_bytes(b"not a sqlite database" * 100)
+    cache = SharedCache(str(path))
+    assert cache.get("k", "default") == "default"
+    assert not cache.available
+
+
+def test_tiered_cache_survives_bad_and_foreign_entries(tmp_path):
+    shared = SharedCache(str(tmp_path / "cache.sqlite3"))
+    writer = TieredCache("ns", ttl=60, shared=shared)
+    shared.set(writer._shared_key("odd"), ["not", "wrapped"], ttl=60)
+    reader = TieredCache("ns", ttl=60, shared=shared)
+    assert reader.get("odd") is MISS
+    writer.set("loc", None)
+    assert reader.get("loc") is None
+
+
+def test_unavailable_tier_degrades_to_misses(tmp_path):
+    cache = SharedCache(str(tmp_path / "missing-dir" / "cache.sqlite3"))
+    assert cache.get("k", "default") == "default"
+    cache.set("k", 1, ttl=60)
+    assert not cache.available
+    tiered = TieredCache("ns", ttl=60, shared=cache)
+    tiered.set("k", "local")
+    assert tiered.get("k") == "local"
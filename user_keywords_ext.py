@@ -1,11 +1,16 @@
 from dotenv import load_dotenv
 load_dotenv()  # take environment variables from .env.
-import nltk
-from rake_nltk import Rake
+import logging
 import os
 import random
+import threading
+from collections import OrderedDict
 from typing import List, Dict, Tuple
 
+from app_logging import get_logger
+
+logger = get_logger(__name__)
+
 
 async def check_keyword_match(extracted_keywords: List[str], target_keywords: List[str]) -> bool:
     """
@@ -23,6 +28,7 @@ async def check_keyword_match(extracted_keywords: List[str], target_keywords: Li
     return False
 
 async def ensure_nltk_resources():
+    import nltk
     # Put a local nltk_data folder in your project root
     nltk_data_dir = os.path.join(os.getcwd(), "nltk_data")
     os.makedirs(nltk_data_dir, exist_ok=True)
@@ -52,8 +58,20 @@ async def ensure_nltk_resources():
             # print(f"Downloading {download_id}...")
             nltk.download(download_id, download_dir=nltk_data_dir, quiet=True)
 
+def preload_nlp():
+    """Import the heavy NLP modules ahead of the first request (blocking)"""
+    import nltk  # noqa: F401
+    import rake_nltk  # noqa: F401
+    if os.getenv("LOCATION_NER_ENGINE", "locationtagger").lower() == "spacy":
+        from location_ner import get_nlp
+        get_nlp()
+    else:
+        import locationtagger  # noqa: F401
+
+
 # Initialize NLTK resources once
 async def get_user_keywords(user_input: str):
+  from rake_nltk import Rake
   await ensure_nltk_resources()
   rake = Rake()
   rake.extract_keywords_from_text(user_input)
@@ -171,9 +189,7 @@ async def rank_hotels_by_keyword_match(items, extracted_keywords,data_type, verb
         scored_items.append((item, match_count, matched_keywords))
         
         if verbose:
-            print(f"\n{item.get('title', 'Unknown')}:")
-            print(f"  Score: {match_count}")
-            print(f"  Matched keywords: {matched_keywords}")
+            logger.debug("%s: score=%d matched=%s", item.get('title', 'Unknown'), match_count, matched_keywords)
     
     # Sort by match count (descending)
     scored_items.sort(key=lambda x: x[1], reverse=True)
@@ -182,17 +198,34 @@ async def rank_hotels_by_keyword_match(items, extracted_keywords,data_type, verb
     return scored_items
 
 
+def boost_nearby(ranked_items, proximity):
+    """
+    Count items near the query's landmark as matching it, even when the
+    landmark is not spelled out in their address, then re-sort by score with
+    distance breaking ties (other items keep their order)
+    """
+    boosted = []
+    for item, score, matched_keywords in ranked_items:
+        distance = proximity.distances.get(item.get('product_ref'))
+        if distance is not None and not any(proximity.covers(kw) for kw in matched_keywords):
+            score += 1
+            matched_keywords = matched_keywords + [proximity.name]
+        boosted.append((item, score, matched_keywords))
+    boosted.sort(key=lambda x: (-x[1], proximity.distances.get(x[0].get('product_ref'), float('inf'))))
+    return boosted
+
+
 async def hotel_data_extractor_with_rake(json_data, location, user_input):
     """Extract hotels from JSON data using RAKE-extracted keywords"""
     
     extracted_keywords = await get_user_keywords(user_input)
-    print(f"Extracted keywords from user input: {extracted_keywords}")
+    logger.debug("Extracted keywords from user input: %s", extracted_keywords)
     
     # Get all hotels for the specified location
     all_hotels = json_data.get("Hotels", {}).get(f"{location.lower()}_hotels", [])
     
     if not all_hotels:
-        print(f"No hotels found for location: {location}")
+        logger.debug("No hotels found for location: %s", location)
         return []
     
     # Initialize filtered hotels list
@@ -215,21 +248,21 @@ async def hotel_data_extractor_with_rake(json_data, location, user_input):
             if str(hotel.get('type_of_visit', '')).lower() == 'family'
         ]
         filtered_hotels = family_hotels
-        print(f"Found {len(filtered_hotels)} family hotels, also works for kids facilities")
+        logger.debug("Found %d family hotels, also works for kids facilities", len(filtered_hotels))
     
     elif await check_keyword_match(extracted_keywords, solo_keywords):
         filtered_hotels = [
             hotel for hotel in all_hotels 
             if str(hotel.get('type_of_visit', '')).lower() == 'solo'
         ]
-        print(f"Found {len(filtered_hotels)} solo hotels")
+        logger.debug("Found %d solo hotels", len(filtered_hotels))
     
     elif await check_keyword_match(extracted_keywords, partner_keywords):
         filtered_hotels = [
             hotel for hotel in all_hotels 
             if str(hotel.get('type_of_visit', '')).lower() == 'family'
         ]
-        print(f"Found {len(filtered_hotels)} hotels for partners")
+        logger.debug("Found %d hotels for partners", len(filtered_hotels))
     
     elif await check_keyword_match(extracted_keywords, adult_keywords):
         filtered_hotels = [
@@ -238,12 +271,12 @@ async def hotel_data_extractor_with_rake(json_data, location, user_input):
         ]
         # print(f"Found {len(filtered_hotels)} hotels for partners")
         # filtered_hotels = random.sample(all_hotels, min(4, len(all_hotels)))
-        print(f"Found {len(filtered_hotels)} hotels with 'adults' in Product SubType Category")
+        logger.debug("Found %d hotels with 'adults' in Product SubType Category", len(filtered_hotels))
     
     # ✅ FIXED: Use all_hotels when no travel type keyword
     else:
         filtered_hotels = all_hotels
-        print(f"No specific travel type keywords. Using all {len(filtered_hotels)} hotels")
+        logger.debug("No specific travel type keywords. Using all %d hotels", len(filtered_hotels))
     
     # Step 2: Apply budget filters (only if filtered_hotels not empty)
     if filtered_hotels:
@@ -262,7 +295,7 @@ async def hotel_data_extractor_with_rake(json_data, location, user_input):
             ]
             if budget_hotels:
                 filtered_hotels = budget_hotels
-                print(f"Applied budget filter: {len(filtered_hotels)} budget hotels (£ or ££)")
+                logger.debug("Applied budget filter: %d budget hotels (£ or ££)", len(filtered_hotels))
         
         elif has_expensive:
             luxury_hotels = [
@@ -271,7 +304,7 @@ async def hotel_data_extractor_with_rake(json_data, location, user_input):
             ]
             if luxury_hotels:
                 filtered_hotels = luxury_hotels
-                print(f"Applied luxury filter: {len(filtered_hotels)} luxury hotels (£££)")
+                logger.debug("Applied luxury filter: %d luxury hotels (£££)", len(filtered_hotels))
     
     # Step 3: Apply month filters (only if filtered_hotels not empty)
     if filtered_hotels:
@@ -292,7 +325,7 @@ async def hotel_data_extractor_with_rake(json_data, location, user_input):
                     mentioned_months.append(month)
             
             mentioned_months = list(set(mentioned_months))
-            print(f"Found month keywords: {mentioned_months}")
+            logger.debug("Found month keywords: %s", mentioned_months)
             
             if mentioned_months:
                 month_filtered_hotels = []
@@ -303,14 +336,14 @@ async def hotel_data_extractor_with_rake(json_data, location, user_input):
                 
                 if month_filtered_hotels:
                     filtered_hotels = month_filtered_hotels
-                    print(f"Applied month filter: {len(filtered_hotels)} hotels in {mentioned_months}")
+                    logger.debug("Applied month filter: %d hotels in %s", len(filtered_hotels), mentioned_months)
                 else:
-                    print(f"No hotels for {mentioned_months}, keeping original results")
+                    logger.debug("No hotels for %s, keeping original results", mentioned_months)
     
     # ✅ FIXED: Step 4 - Final Fallback for Destination_top_response
     # Only runs when filtered_hotels is EMPTY
     if not filtered_hotels:
-        print(f"\n⚠️ No hotels match criteria. Applying Destination_top_response fallback")
+        logger.debug("No hotels match criteria. Applying Destination_top_response fallback")
         
         # Search in all_hotels (not filtered_hotels which is empty)
         top_response_hotels = [
@@ -320,8 +353,9 @@ async def hotel_data_extractor_with_rake(json_data, location, user_input):
         
         if top_response_hotels:
             selected_hotels = top_response_hotels[:3]
-            print(f"   Found {len(top_response_hotels)} hotels with 'Destination_top_response'")
-            print(f"   Selected first 3: {[h.get('title', 'Unknown') for h in selected_hotels]}")
+            logger.debug("Found %d hotels with 'Destination_top_response'", len(top_response_hotels))
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Selected first 3: %s", [h.get('title', 'Unknown') for h in selected_hotels])
             
             if len(selected_hotels) < 3:
                 remaining_slots = 3 - len(selected_hotels)
@@ -330,237 +364,364 @@ async def hotel_data_extractor_with_rake(json_data, location, user_input):
                 if other_hotels:
                     additional = other_hotels[:remaining_slots]
                     selected_hotels.extend(additional)
-                    print(f"   Added {len(additional)} more hotels to reach 3 total")
+                    logger.debug("Added %d more hotels to reach 3 total", len(additional))
             
             filtered_hotels = selected_hotels
         else:
             # Absolute fallback - first 3 from all_hotels
             filtered_hotels = all_hotels[:3]
-            print(f"   No 'Destination_top_response' hotels. Returning first 3 hotels")
+            logger.debug("No 'Destination_top_response' hotels. Returning first 3 hotels")
     
     # Step 5: Rank hotels by keyword match
-    print(f"\nBefore ranking: {len(filtered_hotels)} hotels")
+    logger.debug("Before ranking: %d hotels", len(filtered_hotels))
     ranked_hotels = await rank_hotels_by_keyword_match(
         filtered_hotels, 
         extracted_keywords, 
         verbose=False
     )
     
-    print(f"Final result: {len(ranked_hotels)} hotels (ranked by relevance)")
+    logger.debug("Final result: %d hotels (ranked by relevance)", len(ranked_hotels))
     return ranked_hotels
 
 
 
 
-async def data_extractor_with_rake(json_data, location, user_input, data_type:str):
+# Keyword categories used by the filter cascade
+FAMILY_KEYWORDS = ['family', 'families']
+CHILD_KEYWORDS = ['child', 'kid', 'children', 'baby', 'kids', 'babies', 'toddler', 'infant']
+SOLO_KEYWORDS = ['solo', 'alone', 'single', 'individual']
+PARTNER_KEYWORDS = ['partner', 'couple', 'romantic', 'couples', 'romance', 'honeymoon']
+ADULT_KEYWORDS = ['adult', 'adults']
+BUDGET_CHEAP_KEYWORDS = ['budget', 'cheap', 'low price', 'less price', 'cheapest',
+                         'affordable', 'inexpensive']
+BUDGET_EXPENSIVE_KEYWORDS = ['expensive', 'luxury', 'rich', 'premium', 'high-end',
+                             'luxurious', 'upscale']
+MONTH_KEYWORDS = [
+    'january', 'february', 'march', 'april', 'may', 'june',
+    'july', 'august', 'september', 'october', 'november', 'december',
+    'jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'
+]
+CATEGORY_KEYWORDS = {
+    kw.lower() for kw in (FAMILY_KEYWORDS + CHILD_KEYWORDS + SOLO_KEYWORDS +
+                          PARTNER_KEYWORDS + ADULT_KEYWORDS +
+                          BUDGET_CHEAP_KEYWORDS + BUDGET_EXPENSIVE_KEYWORDS +
+                          MONTH_KEYWORDS)
+}
+
+
+def _matches_any(extracted_keywords: List[str], target_keywords: List[str]) -> bool:
+    """Synchronous twin of check_keyword_match"""
+    extracted_lower = [kw.lower() for kw in extracted_keywords]
+    target_lower = [kw.lower() for kw in target_keywords]
+    for extracted_kw in extracted_lower:
+        for target_kw in target_lower:
+            if target_kw in extracted_kw or extracted_kw in target_kw:
+                return True
+    return False
+
+
+def intent_signature(extracted_keywords: List[str], data_type: str) -> Tuple:
     """
-    Extract items (hotels/activities/restaurants/shopping) from JSON data using RAKE-extracted keywords
-    
-    Args:
-        json_data: Complete JSON with Hotels, Activities, Restaurants, Shopping
-        location: Location (e.g., "paris")
-        user_input: User query
-        data_type: "Hotels", "Activities", "Restaurants", or "Shopping"
-        min_match_threshold: Minimum keyword matches required (default: 2)
+    Everything the filter cascade depends on besides the candidate items:
+    (type_of_visit filter, budget class, mentioned months, review keywords).
+    Review keywords only apply to Hotels.
     """
-    min_match_threshold=4
-    extracted_keywords = await get_user_keywords(user_input)
-    print(f"Extracted keywords from user input: {extracted_keywords}")
-    
-    # Get items for the specified location and data type
-    all_items = json_data.get(data_type, {}).get(f"{location.lower()}_{data_type.lower()}", [])
-    
-    if not all_items:
-        print(f"No {data_type.lower()} found for location: {location}")
-        return []
-    
-    # Initialize filtered items list
-    filtered_items = []
-    
-    # Define keyword categories
-    family_keywords = ['family', 'families']
-    child_keywords = ['child', 'kid', 'children', 'baby', 'kids', 'babies', 'toddler', 'infant']
-    solo_keywords = ['solo', 'alone', 'single', 'individual']
-    partner_keywords = ['partner', 'couple', 'romantic', 'couples', 'romance', 'honeymoon']
-    adult_keywords = ['adult', 'adults']
-    
+    # Step 1 input: travel type (partners and adults map to family stays)
+    if _matches_any(extracted_keywords, FAMILY_KEYWORDS) or _matches_any(extracted_keywords, CHILD_KEYWORDS):
+        visit = 'family'
+    elif _matches_any(extracted_keywords, SOLO_KEYWORDS):
+        visit = 'solo'
+    elif _matches_any(extracted_keywords, PARTNER_KEYWORDS) or _matches_any(extracted_keywords, ADULT_KEYWORDS):
+        visit = 'family'
+    else:
+        visit = None
+
+    # Step 2 input: budget class
+    if _matches_any(extracted_keywords, BUDGET_CHEAP_KEYWORDS):
+        budget = 'cheap'
+    elif _matches_any(extracted_keywords, BUDGET_EXPENSIVE_KEYWORDS):
+        budget = 'luxury'
+    else:
+        budget = None
+
+    # Step 3 input: months named exactly as a keyword
+    extracted_lower = {kw.lower().strip() for kw in extracted_keywords}
+    months = tuple(sorted({m for m in MONTH_KEYWORDS if m in extracted_lower}))
+
+    # Step 3.5 input: non-category keywords searched in hotel reviews
+    reviews = ()
+    if data_type == "Hotels":
+        reviews = tuple(sorted({kw.lower() for kw in extracted_keywords if kw.lower() not in CATEGORY_KEYWORDS}))
+
+    return (visit, budget, months, reviews)
+
+
+def filter_candidates(all_items: List[Dict], data_type: str, intent: Tuple) -> List[Dict]:
+    """Run the filter cascade (steps 1-4) for an intent signature"""
+    visit, budget, months, reviews = intent
+    kind = data_type.lower()
+
     # Step 1: Filter by travel type
-    has_family = await check_keyword_match(extracted_keywords, family_keywords)
-    has_child = await check_keyword_match(extracted_keywords, child_keywords)
-    
-    if has_family or has_child:
-        family_items = [
-            item for item in all_items 
-            if str(item.get('type_of_visit', '')).lower() == 'family'
-        ]
-        filtered_items = family_items
-        print(f"Found {len(filtered_items)} family {data_type.lower()}")
-    
-    elif await check_keyword_match(extracted_keywords, solo_keywords):
-        filtered_items = [
-            item for item in all_items 
-            if str(item.get('type_of_visit', '')).lower() == 'solo'
-        ]
-        print(f"Found {len(filtered_items)} solo {data_type.lower()}")
-    
-    elif await check_keyword_match(extracted_keywords, partner_keywords):
-        filtered_items = [
-            item for item in all_items 
-            if str(item.get('type_of_visit', '')).lower() == 'family'
-        ]
-        print(f"Found {len(filtered_items)} {data_type.lower()} for partners")
-    
-    elif await check_keyword_match(extracted_keywords, adult_keywords):
+    if visit:
         filtered_items = [
-            item for item in all_items 
-            if str(item.get('type_of_visit', '')).lower() == 'family'
+            item for item in all_items
+            if str(item.get('type_of_visit', '')).lower() == visit
         ]
-        print(f"Found {len(filtered_items)} {data_type.lower()} with 'adults'")
-    
+        logger.debug("Found %d %s %s", len(filtered_items), visit, kind)
     else:
         filtered_items = all_items
-        print(f"No specific travel type keywords. Using all {len(filtered_items)} {data_type.lower()}")
-    
+        logger.debug("No specific travel type keywords. Using all %d %s", len(filtered_items), kind)
+
     # Step 2: Apply budget filters
-    if filtered_items:
-        budget_cheap_keywords = ['budget', 'cheap', 'low price', 'less price', 'cheapest', 
-                                 'affordable', 'inexpensive']
-        budget_expensive_keywords = ['expensive', 'luxury', 'rich', 'premium', 'high-end', 
-                                     'luxurious', 'upscale']
-        
-        has_cheap = await check_keyword_match(extracted_keywords, budget_cheap_keywords)
-        has_expensive = await check_keyword_match(extracted_keywords, budget_expensive_keywords)
-        
-        if has_cheap:
+    if filtered_items and budget:
+        if budget == 'cheap':
             budget_items = [
-                item for item in filtered_items 
+                item for item in filtered_items
                 if str(item.get('budget', '')) in ['£', '££']
             ]
-            if budget_items:
-                filtered_items = budget_items
-                print(f"Applied budget filter: {len(filtered_items)} budget {data_type.lower()}")
-        
-        elif has_expensive:
-            luxury_items = [
-                item for item in filtered_items 
+        else:
+            budget_items = [
+                item for item in filtered_items
                 if str(item.get('budget', '')) == '£££'
             ]
-            if luxury_items:
-                filtered_items = luxury_items
-                print(f"Applied luxury filter: {len(filtered_items)} luxury {data_type.lower()}")
-    
+        if budget_items:
+            filtered_items = budget_items
+            logger.debug("Applied %s filter: %d %s", budget, len(filtered_items), kind)
+
     # Step 3: Apply month filters
-    if filtered_items:
-        month_keywords = [
-            'january', 'february', 'march', 'april', 'may', 'june',
-            'july', 'august', 'september', 'october', 'november', 'december',
-            'jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'
-        ]
-        
-        has_month = await check_keyword_match(extracted_keywords, month_keywords)
-        
-        if has_month:
-            mentioned_months = []
-            extracted_lower = {kw.lower().strip() for kw in extracted_keywords}
-            
-            for month in month_keywords:
-                if month in extracted_lower:
-                    mentioned_months.append(month)
-            
-            mentioned_months = list(set(mentioned_months))
-            print(f"Found month keywords: {mentioned_months}")
-            
-            if mentioned_months:
-                month_filtered_items = []
-                for item in filtered_items:
-                    item_months = str(item.get('time_of_year', '')).lower()
-                    if any(month in item_months for month in mentioned_months):
-                        month_filtered_items.append(item)
-                
-                if month_filtered_items:
-                    filtered_items = month_filtered_items
-                    print(f"Applied month filter: {len(filtered_items)} {data_type.lower()}")
-                else:
-                    print(f"No {data_type.lower()} for {mentioned_months}, keeping original results")
-    
-    # ✅ NEW: Step 3.5: Filter by review content (Hotels only)
-    if filtered_items and data_type == "Hotels":
-        # Check if any non-category keywords exist that should be searched in reviews
-        category_keywords = (family_keywords + child_keywords + solo_keywords + 
-                           partner_keywords + adult_keywords + 
-                           budget_cheap_keywords + budget_expensive_keywords + 
-                           month_keywords)
-        
-        # Find keywords that are NOT category keywords
-        review_search_keywords = [
-            kw for kw in extracted_keywords 
-            if kw.lower() not in [ck.lower() for ck in category_keywords]
+    if filtered_items and months:
+        logger.debug("Found month keywords: %s", months)
+        month_filtered_items = [
+            item for item in filtered_items
+            if any(month in str(item.get('time_of_year', '')).lower() for month in months)
         ]
-        
-        if review_search_keywords:
-            print(f"Searching reviews for keywords: {review_search_keywords}")
-            
-            review_filtered_items = []
-            for item in filtered_items:
-                # Combine all review fields
-                all_reviews = ' '.join([
-                    str(item.get('review_1', '')),
-                    str(item.get('review_2', ''))
-                ]).lower()
-                
-                # Also search in features/amenities
-                features = str(item.get('features_amenities', '')).lower()
-                
-                # Combine searchable content
-                searchable_content = all_reviews + ' ' + features
-                
-                # Check if any review keyword appears
-                if any(kw.lower() in searchable_content for kw in review_search_keywords):
-                    review_filtered_items.append(item)
-            
-            if review_filtered_items:
-                print(f"Found {len(review_filtered_items)} hotels with keywords in reviews/features")
-                filtered_items = review_filtered_items
-            else:
-                print(f"No hotels found with review keywords. Keeping {len(filtered_items)} hotels from previous filters")
-    
+        if month_filtered_items:
+            filtered_items = month_filtered_items
+            logger.debug("Applied month filter: %d %s", len(filtered_items), kind)
+        else:
+            logger.debug("No %s for %s, keeping original results", kind, months)
+
+    # Step 3.5: Filter by review content (Hotels only)
+    if filtered_items and reviews:
+        logger.debug("Searching reviews for keywords: %s", reviews)
+        review_filtered_items = []
+        for item in filtered_items:
+            # Reviews plus features/amenities
+            searchable_content = ' '.join([
+                str(item.get('review_1', '')),
+                str(item.get('review_2', ''))
+            ]).lower() + ' ' + str(item.get('features_amenities', '')).lower()
+
+            if any(kw in searchable_content for kw in reviews):
+                review_filtered_items.append(item)
+
+        if review_filtered_items:
+            logger.debug("Found %d hotels with keywords in reviews/features", len(review_filtered_items))
+            filtered_items = review_filtered_items
+        else:
+            logger.debug("No hotels found with review keywords. Keeping %d hotels from previous filters", len(filtered_items))
+
     # Step 4: Final Fallback for Destination_top_response
     if not filtered_items:
-        print(f"\n⚠️ No {data_type.lower()} match criteria. Applying Destination_top_response fallback")
-        
+        logger.debug("No %s match criteria. Applying Destination_top_response fallback", kind)
+
         top_response_items = [
-            h for h in all_items 
+            h for h in all_items
             if 'destination_top_response' in str(h.get('product_subtype_category', '')).lower()
         ]
-        
+
         if top_response_items:
             selected_items = top_response_items[:3]
-            print(f"   Found {len(top_response_items)} {data_type.lower()} with 'Destination_top_response'")
-            print(f"   Selected first 3: {[h.get('title', 'Unknown') for h in selected_items]}")
-            
+            logger.debug("Found %d %s with 'Destination_top_response'", len(top_response_items), kind)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Selected first 3: %s", [h.get('title', 'Unknown') for h in selected_items])
+
             if len(selected_items) < 3:
                 remaining_slots = 3 - len(selected_items)
                 other_items = [h for h in all_items if h not in selected_items]
-                
+
                 if other_items:
                     additional = other_items[:remaining_slots]
                     selected_items.extend(additional)
-                    print(f"   Added {len(additional)} more {data_type.lower()}")
-            
+                    logger.debug("Added %d more %s", len(additional), kind)
+
             filtered_items = selected_items
         else:
             filtered_items = all_items[:3]
-            print(f"   No 'Destination_top_response' {data_type.lower()}. Returning first 3")
+            logger.debug("No 'Destination_top_response' %s. Returning first 3", kind)
+
+    return filtered_items
+
+
+class FilterCache:
+    """
+    LRU of filter cascade results.
+
+    Key: (catalog version, location, data type, intent signature).
+    Value: tuple of product_refs of the surviving candidates.
+    """
+
+    def __init__(self, max_entries: int = 20000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        # (catalog version, location, data type) -> (item list, {product_ref: item})
+        self._refs = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _ref_map(self, version, location, data_type, all_items) -> Dict:
+        key = (version, location, data_type)
+        cached = self._refs.get(key)
+        # Catalog writes swap in a new bucket list, so identity tells whether
+        # the map was built from these very items
+        if cached is None or cached[0] is not all_items:
+            cached = (all_items, {item.get('product_ref'): item for item in all_items})
+            with self._lock:
+                # Drop maps from older catalog versions
+                for old in [k for k in self._refs if k[0] != version]:
+                    del self._refs[old]
+                self._refs[key] = cached
+        return cached[1]
+
+    def get_or_compute(self, version, location: str, data_type: str, intent: Tuple, all_items: List[Dict]) -> List[Dict]:
+        key = (version, location.lower(), data_type, intent)
+        with self._lock:
+            refs = self._entries.get(key)
+            if refs is not None:
+                self._entries.move_to_end(key)
+        if refs is not None:
+            ref_map = self._ref_map(version, location.lower(), data_type, all_items)
+            if all(ref in ref_map for ref in refs):
+                self.hits += 1
+                return [ref_map[ref] for ref in refs]
+            # Cached from other items than these (a caller with a mismatched
+            # version): recompute rather than fail
+            logger.warning("Filter cache entry does not match the catalog items, recomputing")
+
+        self.misses += 1
+        items = filter_candidates(all_items, data_type, intent)
+        refs = tuple(item.get('product_ref') for item in items)
+        # Only cacheable when every candidate has a distinct product_ref
+        if None not in refs and len(set(refs)) == len(refs):
+            with self._lock:
+                self._entries[key] = refs
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return items
+
+    def stats(self) -> Dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+filter_cache = FilterCache(max_entries=int(os.getenv("FILTER_CACHE_SIZE", "20000")))
+
+
+def warm_filter_cache(json_data, catalog_version) -> int:
+    """
+    Precompute every intent without review keywords (travel type x budget x
+    no month or a single month) for every location and category.
+    Returns the number of combinations computed.
+    """
+    visits = (None, 'family', 'solo')
+    budgets = (None, 'cheap', 'luxury')
+    month_options = [()] + [(m,) for m in sorted(set(MONTH_KEYWORDS))]
+    count = 0
+    for data_type in ("Hotels", "Activities", "Restaurants", "Shopping"):
+        suffix = f"_{data_type.lower()}"
+        for bucket, all_items in json_data.get(data_type, {}).items():
+            if not bucket.endswith(suffix) or not all_items:
+                continue
+            location = bucket[: -len(suffix)]
+            for visit in visits:
+                for budget in budgets:
+                    for months in month_options:
+                        filter_cache.get_or_compute(catalog_version, location, data_type,
+                                                    (visit, budget, months, ()), all_items)
+                        count += 1
+    logger.info("Filter cache warmed", extra={"data": {"combinations": count}})
+    return count
+
+
+class FilterCacheWarmer:
+    """
+    Keeps filter_cache warm across catalog versions: ``warm()`` (blocking)
+    warms the catalog returned by ``snapshot`` unless that version is already
+    warm. One warm runs at a time; a call during a run returns at once and the
+    running warm catches up with the newer version before it finishes.
+    """
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self.warmed_version = None
+        self._lock = threading.Lock()
+
+    def stale(self, version) -> bool:
+        return version != self.warmed_version
+
+    def warm(self) -> None:
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            while True:
+                json_data, version = self.snapshot()
+                if not self.stale(version):
+                    return
+                warm_filter_cache(json_data, version)
+                self.warmed_version = version
+        finally:
+            self._lock.release()
+
+
+async def data_extractor_with_rake(json_data, location, user_input, data_type:str,
+                                   catalog_version=None, extracted_keywords=None, max_rank_keywords=None,
+                                   proximity=None):
+    """
+    Extract items (hotels/activities/restaurants/shopping) from JSON data using RAKE-extracted keywords
+    
+    Args:
+        json_data: Complete JSON with Hotels, Activities, Restaurants, Shopping
+        location: Location (e.g., "paris")
+        user_input: User query
+        data_type: "Hotels", "Activities", "Restaurants", or "Shopping"
+        catalog_version: When given, filter results are memoized per intent in filter_cache
+        extracted_keywords: Precomputed RAKE keywords (computed from user_input if None)
+        max_rank_keywords: Score only the top N keywords when ranking (deadline degradation)
+        proximity: geo_index.Proximity for a landmark named in the query; nearby items
+            count as matching it and rank closest first among equal scores
+    """
+    min_match_threshold=4
+    if extracted_keywords is None:
+        extracted_keywords = await get_user_keywords(user_input)
+    logger.debug("Extracted keywords from user input: %s", extracted_keywords)
+    
+    # Get items for the specified location and data type
+    all_items = json_data.get(data_type, {}).get(f"{location.lower()}_{data_type.lower()}", []) if location else []
+    
+    if not all_items:
+        logger.debug("No %s found for location: %s", data_type.lower(), location)
+        return []
+    
+    # Steps 1-4: travel type -> budget -> months -> reviews -> fallback
+    intent = intent_signature(extracted_keywords, data_type)
+    if catalog_version is None:
+        filtered_items = filter_candidates(all_items, data_type, intent)
+    else:
+        filtered_items = filter_cache.get_or_compute(catalog_version, location, data_type, intent, all_items)
     
     # Step 5: Rank items by keyword match
-    print(f"\nBefore ranking: {len(filtered_items)} {data_type.lower()}")
+    logger.debug("Before ranking: %d %s", len(filtered_items), data_type.lower())
+    # RAKE phrases are ordered by score, so a cap keeps the strongest ones
+    rank_keywords = extracted_keywords if max_rank_keywords is None else extracted_keywords[:max_rank_keywords]
     ranked_items = await rank_hotels_by_keyword_match(
         filtered_items, 
-        extracted_keywords, 
+        rank_keywords, 
         data_type,
         verbose=False
         
     )
+    if proximity is not None and proximity.distances:
+        ranked_items = boost_nearby(ranked_items, proximity)
     
     # Step 6: Apply minimum threshold and select top 3
     if ranked_items:
@@ -572,18 +733,21 @@ async def data_extractor_with_rake(json_data, location, user_input, data_type:st
         ]
         
         if threshold_items:
-            print(f"Found {len(threshold_items)} {data_type.lower()} meeting minimum threshold ({min_match_threshold} keywords)")
+            logger.debug("Found %d %s meeting minimum threshold (%d keywords)", len(threshold_items), data_type.lower(), min_match_threshold)
             ranked_items = threshold_items
         else:
-            print(f"No {data_type.lower()} meet threshold. Using all ranked results")
+            logger.debug("No %s meet threshold. Using all ranked results", data_type.lower())
         
         # Select top 3
         if len(ranked_items) > 3:
-            print(f"Selecting top 3 {data_type.lower()} from {len(ranked_items)} results")
+            logger.debug("Selecting top 3 %s from %d results", data_type.lower(), len(ranked_items))
             ranked_items = ranked_items[:3]
     
     # Extract just the items (not the tuples)
     final_items = [item for item, score, matched_kw in ranked_items]
     
-    print(f"\n✅ Final result: {len(final_items)} {data_type.lower()} (ranked by relevance)")
-    return final_items
\ No newline at end of file
+    logger.debug(
+        "Final result: %d %s (ranked by relevance)", len(final_items), data_type.lower(),
+        extra={"data": {"data_type": data_type, "location": location, "candidates": len(final_items)}},
+    )
+    return final_items
@@ -0,0 +1,154 @@
+import asyncio
+import os
+import threading
+import time
+from typing import Optional
+
+from app_logging import get_logger
+from resilience import CircuitBreaker, CircuitOpenError, ResilientCall
+from shared_cache import SharedCache, shared_cache
+
+logger = get_logger(__name__)
+
+# Overridable so the resilience layer can be exercised against
+# fake_weather_server.py with injected latency
+WEATHER_API_URL = os.getenv("WEATHER_API_URL", "http://api.openweathermap.org/data/2.5/weather")
+WEATHER_TTL_S = float(os.getenv("WEATHER_TTL_S", "900"))
+WEATHER_TIMEOUT_S = float(os.getenv("WEATHER_TIMEOUT_S", "10"))
+
+# Shown when the circuit is open and there is no previous value to fall back to
+NEUTRAL_WEATHER_TEXT = "Check the local forecast shortly before you travel."
+
+
+class WeatherNotFound(Exception):
+    """Upstream answered, but not with weather for this location"""
+
+
+class WeatherUpstreamError(Exception):
+    """Upstream is unhealthy (5xx or rate limited)"""
+
+
+def fetch_weather_text_sync(location: str, api_key: str, timeout: float = WEATHER_TIMEOUT_S) -> str:
+    """Blocking OpenWeatherMap call, returns the sentence used in the prompt"""
+    import requests
+
+    params = {
+        "q": location.capitalize(),
+        "appid": api_key,
+        "units": "metric"
+    }
+    response = requests.get(WEATHER_API_URL, params=params, timeout=timeout)
+    if response.status_code >= 500 or response.status_code == 429:
+        raise WeatherUpstreamError(f"HTTP {response.status_code}")
+    if response.status_code != 200:
+        raise WeatherNotFound(location)
+    weather_data = response.json()
+    return (
+        f"The current weather in {location.capitalize()} is {weather_data['main']['temp']}°C, "
+        f"with a 'feels like' temperature of {weather_data['main']['feels_like']}°C."
+    )
+
+
+weather_upstream = ResilientCall(
+    CircuitBreaker(
+        "weather",
+        failure_threshold=int(os.getenv("WEATHER_CB_FAILURES", "5")),
+        slow_call_s=float(os.getenv("WEATHER_CB_SLOW_S", "2")),
+        open_duration=float(os.getenv("WEATHER_CB_OPEN_S", "30")),
+    ),
+    hedge=os.getenv("WEATHER_HEDGE", "0") == "1",
+)
+
+
+async def fetch_weather_text(location: str, api_key: str) -> str:
+    """Upstream fetch on a worker thread, behind the circuit breaker.
+
+    Raises CircuitOpenError without calling upstream while the circuit is open.
+    """
+    return await weather_upstream(
+        lambda: asyncio.to_thread(fetch_weather_text_sync, location, api_key),
+        is_failure=lambda e: not isinstance(e, WeatherNotFound),
+    )
+
+
+class WeatherCache:
+    """TTL cache of weather text keyed by lowercase location.
+
+    Per-process entries sit in front of the host-wide shared tier, so a fetch
+    by one worker (or its prefetcher) serves every worker. The shared tier
+    keeps entries for ``stale_factor`` x TTL so stale values remain available
+    as a circuit-breaker fallback.
+    """
+
+    def __init__(self, ttl: float = WEATHER_TTL_S, shared: Optional[SharedCache] = shared_cache,
+                 stale_factor: float = 4.0):
+        self.ttl = ttl
+        self.shared = shared
+        self.stale_factor = stale_factor
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, location: str):
+        """(text, fetched_at), reading through to the shared tier when the
+        local entry is missing or expired"""
+        key = location.lower()
+        with self._lock:
+            entry = self._entries.get(key)
+        if (entry is None or time.time() - entry[1] > self.ttl) and self.shared is not None:
+            shared = self.shared.get(f"weather:{key}")
+            valid = isinstance(shared, dict) and "text" in shared and "fetched_at" in shared
+            if valid and (entry is None or shared["fetched_at"] > entry[1]):
+                entry = (shared["text"], shared["fetched_at"])
+                with self._lock:
+                    self._entries[key] = entry
+        return entry
+
+    def get(self, location: str) -> Optional[str]:
+        """Fresh value or None"""
+        entry = self._entry(location)
+        if entry is None or time.time() - entry[1] > self.ttl:
+            return None
+        return entry[0]
+
+    def get_stale(self, location: str) -> Optional[str]:
+        """Last known value regardless of age"""
+        entry = self._entry(location)
+        return entry[0] if entry else None
+
+    def expires_in(self, location: str) -> float:
+        """Seconds until the entry expires (negative or -inf when stale/missing)"""
+        entry = self._entry(location)
+        if entry is None:
+            return float("-inf")
+        return entry[1] + self.ttl - time.time()
+
+    def put(self, location: str, text: str) -> None:
+        key = location.lower()
+        fetched_at = time.time()
+        with self._lock:
+            self._entries[key] = (text, fetched_at)
+        if self.shared is not None:
+            self.shared.set(f"weather:{key}", {"text": text, "fetched_at": fetched_at},
+                            self.ttl * self.stale_factor)
+
+
+weather_cache = WeatherCache()
+
+
+async def get_weather(location: str, api_key: str) -> str:
+    """Cached weather text for a location, fetching on a miss"""
+    location = location.lower()
+    cached = weather_cache.get(location)
+    if cached is not None:
+        return cached
+    try:
+        text = await fetch_weather_text(location, api_key)
+    except CircuitOpenError:
+        # Fail fast: last known value, else a neutral line
+        return weather_cache.get_stale(location) or NEUTRAL_WEATHER_TEXT
+    except WeatherNotFound:
+        return f"❌ Weather data for {location.capitalize()} not found. Please try again later."
+    except Exception as e:
+        return f"❌ Failed to fetch weather data for {location.capitalize()}: {str(e)}"
+    weather_cache.put(location, text)
+    return text
@@ -0,0 +1,129 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import List
+
+from app_logging import get_logger
+from weather import WeatherCache, fetch_weather_text, weather_cache
+
+logger = get_logger(__name__)
+
+
+class LocationPopularity:
+    """Exponentially decayed request counts per location"""
+
+    def __init__(self, half_life: float = 3600.0):
+        self.half_life = half_life
+        self._scores = {}
+        self._lock = threading.Lock()
+
+    def _decayed(self, score: float, last: float, now: float) -> float:
+        return score * 0.5 ** ((now - last) / self.half_life)
+
+    def record(self, location: str) -> None:
+        now = time.time()
+        key = location.lower()
+        with self._lock:
+            score, last = self._scores.get(key, (0.0, now))
+            self._scores[key] = (self._decayed(score, last, now) + 1.0, now)
+
+    def top(self, n: int) -> List[str]:
+        now = time.time()
+        with self._lock:
+            ranked = sorted(
+                ((self._decayed(score, last, now), loc) for loc, (score, last) in self._scores.items()),
+                reverse=True,
+            )
+            # Forget locations that have decayed to nothing
+            for score, loc in ranked:
+                if score < 0.01:
+                    del self._scores[loc]
+        return [loc for score, loc in ranked[:n] if score >= 0.01]
+
+
+class WeatherPrefetcher:
+    """Refresh weather for the most requested locations before it expires.
+
+    Upstream calls are capped by ``concurrency``, spaced at least
+    ``1 / rate_per_s`` apart, and delayed by up to ``jitter`` seconds so that
+    refreshes of many entries do not line up.
+    """
+
+    def __init__(self, api_key: str, popularity: LocationPopularity, cache: WeatherCache = weather_cache,
+                 top_n: int = 20, interval: float = 60.0, refresh_ahead: float = 120.0,
+                 rate_per_s: float = 1.0, concurrency: int = 2, jitter: float = 5.0,
+                 exclude=("paris",)):
+        self.api_key = api_key
+        self.popularity = popularity
+        self.cache = cache
+        self.top_n = top_n
+        self.interval = interval
+        self.refresh_ahead = refresh_ahead
+        self.min_spacing = 1.0 / rate_per_s if rate_per_s > 0 else 0.0
+        self.jitter = jitter
+        # Paris weather is stored permanently in the catalog, never in the cache
+        self.exclude = set(exclude)
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+        self._rate_lock = asyncio.Lock()
+        self._next_call = 0.0
+        self.refreshed = 0
+        self.failed = 0
+
+    async def _rate_limit(self) -> None:
+        async with self._rate_lock:
+            now = time.monotonic()
+            wait = self._next_call - now
+            self._next_call = max(now, self._next_call) + self.min_spacing
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def _refresh(self, location: str) -> None:
+        await asyncio.sleep(random.uniform(0, self.jitter))
+        async with self._semaphore:
+            await self._rate_limit()
+            try:
+                text = await fetch_weather_text(location, self.api_key)
+            except Exception as e:
+                self.failed += 1
+                logger.warning("Weather prefetch failed for %s: %s", location, e)
+                return
+            # Shared-tier writes are blocking sqlite I/O: keep them off the loop
+            await asyncio.to_thread(self.cache.put, location, text)
+            self.refreshed += 1
+            logger.debug("Prefetched weather for %s", location)
+
+    def due(self) -> List[str]:
+        """Popular locations whose cache entry is missing or about to expire"""
+        return [
+            loc for loc in self.popularity.top(self.top_n)
+            if loc not in self.exclude and self.cache.expires_in(loc) < self.refresh_ahead
+        ]
+
+    async def run_once(self) -> None:
+        due = await asyncio.to_thread(self.due)
+        if due:
+            await asyncio.gather(*(self._refresh(loc) for loc in due))
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Weather prefetch cycle failed")
+            await asyncio.sleep(self.interval)
+
+
+def prefetcher_from_env(api_key: str, popularity: LocationPopularity) -> WeatherPrefetcher:
+    """Build the prefetcher from WEATHER_PREFETCH_* environment variables"""
+    return WeatherPrefetcher(
+        api_key=api_key,
+        popularity=popularity,
+        top_n=int(os.getenv("WEATHER_PREFETCH_TOP_N", "20")),
+        interval=float(os.getenv("WEATHER_PREFETCH_INTERVAL_S", "60")),
+        refresh_ahead=float(os.getenv("WEATHER_PREFETCH_AHEAD_S", "120")),
+        rate_per_s=float(os.getenv("WEATHER_PREFETCH_RATE", "1")),
+        concurrency=int(os.getenv("WEATHER_PREFETCH_CONCURRENCY", "2")),
+        jitter=float(os.getenv("WEATHER_PREFETCH_JITTER_S", "5")),
+    )